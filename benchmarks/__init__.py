@@ -0,0 +1,8 @@
+"""Reproducible benchmarks of the readers, writers and analyses of pynnp on seeded synthetic data sets.
+
+Run from the root of the repository, e.g.
+    python -m benchmarks --scale small --output results.json
+    python -m benchmarks --scale small --baseline results.json
+"""
+from .generators import *
+from .suite import *
@@ -0,0 +1,69 @@
+from .suite import SCALES, check_compressed_append, check_runner_parser, check_targets, compare_results, \
+    get_scenarios, load_results, run_benchmarks, save_results
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks of pynnp on synthetic "
+                                     "RuNNer, LAMMPS and OUTCAR files.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="size of the synthetic data sets")
+    parser.add_argument("--samples", type=int, help="number of samples (overrides the scale)")
+    parser.add_argument("--atoms", type=int, nargs="+", help="atoms per sample, fixed or min max (overrides the scale)")
+    parser.add_argument("--elements", type=int, help="number of elements (overrides the scale)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--processes", type=int, help="processes of parallel scenarios (default is all cores)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed calls (the best time is reported)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced call for peak memory")
+    parser.add_argument("--filter", help="run only scenarios whose names contain this string")
+    parser.add_argument("--directory", help="directory of the synthetic files (default is a temporary directory)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with the results of this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative loss of throughput which is "
+                        "reported as regression (default 0.1)")
+    args = parser.parse_args(argv)
+
+    config = dict(SCALES[args.scale])
+    if args.samples is not None:
+        config["number_of_samples"] = args.samples
+    if args.atoms is not None:
+        config["number_of_atoms"] = args.atoms[0] if len(args.atoms) == 1 else tuple(args.atoms[:2])
+    if args.elements is not None:
+        config["number_of_elements"] = args.elements
+    config["seed"] = args.seed
+
+    # a temporary directory is only created (and removed) if no directory is given
+    with tempfile.TemporaryDirectory() if args.directory is None else contextlib.nullcontext(args.directory) \
+            as directory:
+        os.makedirs(directory, exist_ok=True)
+        scenarios = get_scenarios(directory, processes=args.processes, **config)
+        # the parser must give identical results as the line-by-line parser which it replaced
+        mismatches = check_runner_parser(os.path.join(directory, "input.data"))
+        print("%-28s %s" % ("read_runner parser", "identical" if not mismatches
+                            else "MISMATCH (%s)" % ", ".join(mismatches)))
+        append_failures = check_compressed_append(os.path.join(directory, "input.data"), directory)
+        print("%-28s %s" % ("append_runner compression", "ok" if not append_failures
+                            else "FAILED (%s)" % ", ".join(append_failures)))
+        results = run_benchmarks(scenarios, args.repeat, not args.no_memory, args.filter)
+    failures = len(mismatches) + len(append_failures)
+    for name, value, target, passed in check_targets(results):
+        print("%-28s %9.2f (target %.2f) %s" % (name, value, target, "" if passed else "MISSED"))
+        failures += not passed
+    if args.output is not None:
+        config["number_of_atoms"] = list(config["number_of_atoms"]) \
+            if isinstance(config["number_of_atoms"], tuple) else config["number_of_atoms"]
+        save_results(args.output, results, dict(config, scale=args.scale, repeat=args.repeat))
+    if args.baseline is not None:
+        regressions = 0
+        for name, ratio, regression in compare_results(results, load_results(args.baseline), args.tolerance):
+            print("%-28s %6.2fx %s" % (name, ratio, "REGRESSION" if regression else ""))
+            regressions += regression
+        failures += regressions
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Seeded generators of synthetic structure files
+# ----------------------------------------------------------------------------
+SYMBOLS = ("H", "O", "Si", "C", "N", "Na", "Cl", "Fe", "Cu", "Zn")
+
+_RUNNER_ATOM_FORMAT = "atom %15.10f %15.10f %15.10f %s %15.10f %15.10f %15.10f %15.10f %15.10f\n"
+_LAMMPS_ATOM_FORMAT = "%d %d %.10f %.10f %.10f %.10f %.10f %.10f %.10f %.10f\n"
+_OUTCAR_ATOM_FORMAT = "  %12.5f %12.5f %12.5f    %13.6f %13.6f %13.6f\n"
+
+
+def get_symbols(number_of_elements):
+    """This function returns the element symbols used for the given number of elements."""
+    assert 1 <= number_of_elements <= len(SYMBOLS), "Expected 1 to %d elements" % len(SYMBOLS)
+    return list(SYMBOLS[:number_of_elements])
+
+
+def generate_samples(number_of_samples=100, number_of_atoms=64, number_of_elements=2, seed=1234, density=0.1,
+                     triclinic=True):
+    """This function yields random samples as dictionaries of arrays (cell, positions, elements, charges,
+    forces, total_energy). The number of atoms is either fixed or drawn from a (min, max) range for each sample.
+    The cell volume follows the number density (atoms per cubic Angstrom), so that the number of neighbors
+    per atom does not depend on the size of the samples."""
+    rng = np.random.default_rng(seed)
+    for _ in range(number_of_samples):
+        if isinstance(number_of_atoms, (tuple, list)):
+            n_atoms = int(rng.integers(number_of_atoms[0], number_of_atoms[1]+1))
+        else:
+            n_atoms = int(number_of_atoms)
+        length = (n_atoms/density)**(1.0/3.0)
+        cell = np.diag([length, length, length])
+        if triclinic:
+            cell[1, 0] = rng.uniform(-0.1, 0.1)*length
+        yield {
+            "cell": cell,
+            "positions": rng.random((n_atoms, 3)) @ cell,
+            "elements": rng.integers(0, number_of_elements, n_atoms),
+            "charges": rng.uniform(-1.0, 1.0, n_atoms),
+            "atomic_energies": rng.uniform(-5.0, -1.0, n_atoms),
+            "forces": rng.normal(0.0, 1.0, (n_atoms, 3)),
+            "total_energy": -3.0*n_atoms + rng.normal(0.0, 1.0),
+        }
+
+
+def generate_runner(filename, number_of_samples=100, number_of_atoms=64, number_of_elements=2, seed=1234):
+    """This function writes a synthetic RuNNer structure file (input.data) and returns the number of atoms."""
+    symbols = np.array(get_symbols(number_of_elements), dtype=object)
+    total = 0
+    with open(str(filename), "w") as out_file:
+        for index, sample in enumerate(generate_samples(number_of_samples, number_of_atoms, number_of_elements,
+                                                        seed)):
+            n_atoms = len(sample["positions"])
+            rows = np.empty((n_atoms, 9), dtype=object)
+            rows[:, 0:3] = sample["positions"]
+            rows[:, 3] = symbols[sample["elements"]]
+            rows[:, 4] = sample["charges"]
+            rows[:, 5] = 0.0
+            rows[:, 6:9] = sample["forces"]
+            out_file.write("begin\ncomment synthetic sample %d\n" % index
+                           + "lattice %.10f %.10f %.10f\n"*3 % tuple(sample["cell"].ravel().tolist())
+                           + _RUNNER_ATOM_FORMAT*n_atoms % tuple(rows.ravel().tolist())
+                           + "energy %.10f\ncharge %.10f\nend\n" % (sample["total_energy"], 0.0))
+            total += n_atoms
+    return total
+
+
+def generate_lammps(filename, number_of_samples=100, number_of_atoms=64, number_of_elements=2, seed=1234):
+    """This function writes a synthetic LAMMPS dump (id type x y z q c_e0 fx fy fz, triclinic box) and returns
+    the number of atoms and the symbol dictionary of atom types (see RuNNerAdaptorForLAMMPS.read_lammps)."""
+    total = 0
+    with open(str(filename), "w") as out_file:
+        for index, sample in enumerate(generate_samples(number_of_samples, number_of_atoms, number_of_elements,
+                                                        seed)):
+            n_atoms = len(sample["positions"])
+            cell = sample["cell"]
+            xy = cell[1, 0]
+            rows = np.empty((n_atoms, 10), dtype=object)
+            rows[:, 0] = np.arange(1, n_atoms+1)
+            rows[:, 1] = sample["elements"] + 1
+            rows[:, 2:5] = sample["positions"]
+            rows[:, 5] = sample["charges"]
+            rows[:, 6] = sample["atomic_energies"]
+            rows[:, 7:10] = sample["forces"]
+            out_file.write("ITEM: TIMESTEP\n%d\nITEM: NUMBER OF ATOMS\n%d\n" % (index, n_atoms)
+                           + "ITEM: BOX BOUNDS xy xz yz pp pp pp\n"
+                           + "%.10f %.10f %.10f\n" % (min(0.0, xy), cell[0, 0] + max(0.0, xy), xy)
+                           + "0.0 %.10f 0.0\n0.0 %.10f 0.0\n" % (cell[1, 1], cell[2, 2])
+                           + "ITEM: ATOMS id type x y z q c_e0 fx fy fz\n"
+                           + _LAMMPS_ATOM_FORMAT*n_atoms % tuple(rows.ravel().tolist()))
+            total += n_atoms
+    symbol_dict = {str(code+1): symbol for code, symbol in enumerate(get_symbols(number_of_elements))}
+    return total, symbol_dict
+
+
+def generate_outcar(filename, number_of_steps=100, number_of_atoms=64, number_of_elements=2, seed=1234,
+                    number_of_electronic_steps=10):
+    """This function writes a synthetic OUTCAR file of an AIMD run (fixed atoms, sorted by element, with
+    several electronic steps per ionic step) and returns the number of atoms and the list of symbols."""
+    symbols = get_symbols(number_of_elements)
+    assert not isinstance(number_of_atoms, (tuple, list)), "Expected a fixed number of atoms of an OUTCAR file"
+    counts = [len(part) for part in np.array_split(np.arange(number_of_atoms), number_of_elements)]
+    lines = [" vasp.6.3.0 18Jan22 (build Feb 01 2022) complex\n"]
+    for symbol in symbols:
+        lines.append("   VRHFIN =%s: s2p2\n   TITEL  = PAW_PBE %s 05Jan2001\n" % (symbol, symbol))
+    lines.append("   ions per type =   %s\n" % "  ".join(str(count) for count in counts))
+    with open(str(filename), "w") as out_file:
+        out_file.write("".join(lines))
+        for sample in generate_samples(number_of_steps, number_of_atoms, 1, seed, triclinic=False):
+            energy = sample["total_energy"]
+            out_file.write(" VOLUME and BASIS-vectors are now :\n -----\n  energy-cutoff  :  400.00\n\n"
+                           "      direct lattice vectors                 reciprocal lattice vectors\n"
+                           + "    %12.9f %12.9f %12.9f     0.000000000  0.000000000  0.000000000\n"*3
+                           % tuple(sample["cell"].ravel().tolist())
+                           + "  free energy    TOTEN  =       %.8f eV\n" * number_of_electronic_steps
+                           % tuple((energy + 10.0**-np.arange(number_of_electronic_steps)).tolist())
+                           + " POSITION                                       TOTAL-FORCE (eV/Angst)\n"
+                           + " " + "-"*83 + "\n"
+                           + _OUTCAR_ATOM_FORMAT*number_of_atoms
+                           % tuple(np.hstack([sample["positions"], sample["forces"]]).ravel().tolist())
+                           + " " + "-"*83 + "\n    total drift:   0.0 0.0 0.0\n\n"
+                           + "  FREE ENERGIE OF THE ION-ELECTRON SYSTEM (eV)\n  " + "-"*51 + "\n"
+                           + "  free  energy   TOTEN  =       %.8f eV\n\n" % energy
+                           + "  energy  without entropy=  %.8f  energy(sigma->0) =  %.8f\n\n" % (energy, energy))
+    return number_of_steps*number_of_atoms, symbols
@@ -0,0 +1,308 @@
+from .generators import generate_lammps, generate_outcar, generate_runner
+from pynnp import RunnerAdaptor, RuNNerAdaptorForLAMMPS, RuNNerAdaptorForVASP, SymmetryFunction, \
+    SymmetryFunctionSet, UnitConversion, compute_fingerprints
+from collections import OrderedDict
+import gc
+import gzip
+import json
+import os
+import shutil
+import platform
+import time
+import tracemalloc
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Benchmark scenarios
+# ----------------------------------------------------------------------------
+# sizes of the synthetic data sets (number of samples, atoms per sample, number of elements)
+SCALES = {
+    "small": {"number_of_samples": 200, "number_of_atoms": (32, 96), "number_of_elements": 2},
+    "medium": {"number_of_samples": 2000, "number_of_atoms": (32, 160), "number_of_elements": 3},
+    "large": {"number_of_samples": 20000, "number_of_atoms": (32, 256), "number_of_elements": 4},
+}
+
+
+# throughput targets (MB/s on a single core) which are checked by check_targets
+TARGETS = {"read_runner": 40.0}
+# minimum speedup of read_runner over the line-by-line parser which it replaced
+READ_RUNNER_SPEEDUP = 1.5
+
+
+class Scenario:
+    """A class that holds a timed benchmark: a function without arguments and the amount of data
+    (bytes, atoms and samples) which is processed by each call."""
+
+    def __init__(self, name, function, number_of_bytes=0, number_of_atoms=0, number_of_samples=0):
+        self.name = name
+        self.function = function
+        self.number_of_bytes = number_of_bytes
+        self.number_of_atoms = number_of_atoms
+        self.number_of_samples = number_of_samples
+
+    def run(self, repeat=3, memory=True):
+        """This method returns the best and mean time of repeated calls and (optionally) the peak memory
+        of the Python and numpy allocations of a separate call, since tracing slows down the timed calls.
+        Memory of worker processes is not included."""
+        times = []
+        for _ in range(repeat):
+            gc.collect()
+            start_time = time.perf_counter()
+            self.function()
+            times.append(time.perf_counter() - start_time)
+        result = OrderedDict([
+            ("seconds", min(times)),
+            ("mean_seconds", sum(times)/len(times)),
+            ("bytes", self.number_of_bytes),
+            ("atoms", self.number_of_atoms),
+            ("samples", self.number_of_samples),
+            ("mb_per_s", self.number_of_bytes/1e6/min(times) if self.number_of_bytes else None),
+            ("atoms_per_s", self.number_of_atoms/min(times) if self.number_of_atoms else None),
+            ("peak_memory_mb", None),
+        ])
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            self.function()
+            result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1]/1e6
+            tracemalloc.stop()
+        return result
+
+
+def get_symmetry_functions(symbols, cutoff=6.0):
+    """This function returns a small set of radial and angular symmetry functions for all element pairs."""
+    functions = []
+    for element in symbols:
+        for neighbor in symbols:
+            functions += [SymmetryFunction(element, 2, [neighbor], eta, cutoff) for eta in (0.01, 0.1, 0.5)]
+            functions += [SymmetryFunction(element, 9, [neighbor, neighbor], 0.01, cutoff, 0.0, lambd, 2.0)
+                          for lambd in (-1.0, 1.0)]
+    return SymmetryFunctionSet(functions)
+
+
+def read_runner_line_by_line(filename, uc=UnitConversion()):
+    """This function reads a RuNNer file line by line like the original parser of RunnerAdaptor.read_runner
+    (split of each line and substring checks of keywords) and returns the data as a dictionary of arrays.
+    It is the reference of check_runner_parser and of the read_runner_line_by_line scenario."""
+    number_of_atoms, positions, symbols, charges, atomic_energies, forces = [], [], [], [], [], []
+    cells, total_energies, total_charges = [], [], []
+    with open(str(filename), "r") as in_file:
+        line = in_file.readline()
+        while line:
+            if "begin" in line.split()[0]:
+                cell, count, total_energy, total_charge = [], 0, 0.0, 0.0
+                while True:
+                    line = next(in_file).split()
+                    if "comment" in line[0]:
+                        continue
+                    if "lattice" in line[0]:
+                        cell += [float(value)*uc.length for value in line[1:4]]
+                    if "atom" in line[0]:
+                        count += 1
+                        positions.append([float(value)*uc.length for value in line[1:4]])
+                        symbols.append(line[4])
+                        charges.append(float(line[5])*uc.charge)
+                        atomic_energies.append(float(line[6])*uc.energy)
+                        forces.append([float(value)*uc.force for value in line[7:10]])
+                    if "energy" in line[0]:
+                        total_energy = float(line[1])*uc.energy
+                    if "charge" in line[0]:
+                        total_charge = float(line[1])*uc.charge
+                    if "end" in line[0]:
+                        break
+                number_of_atoms.append(count)
+                cells.append(cell)
+                total_energies.append(total_energy)
+                total_charges.append(total_charge)
+            line = in_file.readline()
+    return {
+        "number_of_atoms": np.array(number_of_atoms, dtype=np.int64),
+        "positions": np.array(positions, dtype=float).reshape(-1, 3),
+        "symbols": np.array(symbols, dtype=object),
+        "charges": np.array(charges, dtype=float),
+        "atomic_energies": np.array(atomic_energies, dtype=float),
+        "forces": np.array(forces, dtype=float).reshape(-1, 3),
+        "cells": np.array(cells, dtype=float).reshape(-1, 9),
+        "total_energies": np.array(total_energies, dtype=float),
+        "total_charges": np.array(total_charges, dtype=float),
+    }
+
+
+def check_runner_parser(filename, uc=UnitConversion()):
+    """This function reads a RuNNer file with read_runner and with the line-by-line reference parser and
+    returns the names of arrays which are not identical (an empty list if both parsers agree exactly)."""
+    dataset = RunnerAdaptor().read_runner(filename, uc).dataset
+    reference = read_runner_line_by_line(filename, uc)
+    arrays = {
+        "number_of_atoms": dataset.get_number_of_atoms_per_sample(),
+        "positions": dataset.positions,
+        "symbols": np.array(dataset.symbols, dtype=object)[dataset.elements],
+        "charges": dataset.charges,
+        "atomic_energies": dataset.atomic_energies,
+        "forces": dataset.forces,
+        "cells": dataset.cells,
+        "total_energies": dataset.total_energies,
+        "total_charges": dataset.total_charges,
+    }
+    return [name for name, array in arrays.items() if not np.array_equal(array, reference[name])]
+
+
+def check_compressed_append(filename, directory):
+    """This function checks append_runner on gzip copies of a RuNNer file: appending to a .gz file must give
+    a readable file with all samples, and appending to a gzip file with a misleading suffix must fail without
+    changing the file. It returns a list of failed checks (an empty list if all checks pass)."""
+    failures = []
+    adaptor = RunnerAdaptor().read_runner(filename)
+    n_samples = adaptor.number_of_samples
+    for name in ("append.data.gz", "append.bin"):
+        with open(str(filename), "rb") as in_file, gzip.open(os.path.join(directory, name), "wb") as out_file:
+            shutil.copyfileobj(in_file, out_file)
+    compressed_file, misleading_file = os.path.join(directory, "append.data.gz"), os.path.join(directory, "append.bin")
+    adaptor.append_runner(compressed_file)
+    if RunnerAdaptor().read_runner(compressed_file).number_of_samples != 2*n_samples:
+        failures.append("append to gzip file")
+    with open(misleading_file, "rb") as in_file:
+        data = in_file.read()
+    try:
+        adaptor.append_runner(misleading_file)
+        failures.append("append to gzip file with plain suffix was not rejected")
+    except AssertionError:
+        pass
+    with open(misleading_file, "rb") as in_file:
+        if in_file.read() != data:
+            failures.append("append to gzip file with plain suffix changed the file")
+    return failures
+
+
+def get_scenarios(directory, number_of_samples=200, number_of_atoms=(32, 96), number_of_elements=2, seed=1234,
+                  processes=None):
+    """This function generates the synthetic files in the directory and returns the list of scenarios
+    of readers, writers and analyses."""
+    processes = os.cpu_count() if processes is None else processes
+    runner_file = os.path.join(directory, "input.data")
+    lammps_file = os.path.join(directory, "dump.lammpstrj")
+    outcar_file = os.path.join(directory, "OUTCAR")
+    output_file = os.path.join(directory, "output.data")
+    number_of_steps = max(1, number_of_samples//4)
+    atoms_per_step = number_of_atoms[1] if isinstance(number_of_atoms, (tuple, list)) else number_of_atoms
+
+    n_atoms = generate_runner(runner_file, number_of_samples, number_of_atoms, number_of_elements, seed)
+    n_lammps_atoms, symbol_dict = generate_lammps(lammps_file, number_of_samples, number_of_atoms,
+                                                  number_of_elements, seed)
+    n_outcar_atoms, symbol_list = generate_outcar(outcar_file, number_of_steps, atoms_per_step, number_of_elements,
+                                                  seed)
+    runner_size, lammps_size, outcar_size = [os.path.getsize(filename)
+                                             for filename in (runner_file, lammps_file, outcar_file)]
+    reference = RunnerAdaptor().read_runner(runner_file)
+    prediction = RunnerAdaptor().read_runner(runner_file)
+    prediction.dataset.forces[:] += np.random.default_rng(seed).normal(0.0, 0.1, prediction.dataset.forces.shape)
+    # structure analyses are benchmarked on a subset of samples
+    subset = RunnerAdaptor()
+    subset.dataset = reference.dataset.take(np.arange(min(number_of_samples, 200)))
+    n_subset_atoms = subset.dataset.number_of_atoms
+    symmetry_functions = get_symmetry_functions(reference.dataset.symbols)
+
+    scenarios = [
+        Scenario("read_runner", lambda: RunnerAdaptor().read_runner(runner_file),
+                 runner_size, n_atoms, number_of_samples),
+        Scenario("read_runner_line_by_line", lambda: read_runner_line_by_line(runner_file),
+                 runner_size, n_atoms, number_of_samples),
+        Scenario("read_runner_parallel", lambda: RunnerAdaptor().read_runner(runner_file, processes=processes),
+                 runner_size, n_atoms, number_of_samples),
+        Scenario("write_runner", lambda: reference.write_runner(output_file),
+                 runner_size, n_atoms, number_of_samples),
+        Scenario("read_lammps", lambda: RuNNerAdaptorForLAMMPS().read_lammps(lammps_file, symbol_dict),
+                 lammps_size, n_lammps_atoms, number_of_samples),
+        Scenario("read_outcar", lambda: RuNNerAdaptorForVASP().read_outcar_steps(outcar_file, symbol_list),
+                 outcar_size, n_outcar_atoms, number_of_steps),
+        Scenario("calculate_force_errors", lambda: reference.calculate_force_errors(prediction, "rmse"),
+                 0, n_atoms, number_of_samples),
+        Scenario("calculate_min_distances", lambda: subset.calculate_min_distances(),
+                 0, n_subset_atoms, subset.number_of_samples),
+        Scenario("compute_fingerprints", lambda: compute_fingerprints(subset.dataset),
+                 0, n_subset_atoms, subset.number_of_samples),
+        Scenario("compute_symmetry_functions", lambda: symmetry_functions.compute_dataset(subset.dataset),
+                 0, n_subset_atoms, subset.number_of_samples),
+    ]
+    if processes <= 1:
+        scenarios = [scenario for scenario in scenarios if scenario.name != "read_runner_parallel"]
+    return scenarios
+
+
+# ----------------------------------------------------------------------------
+# Results and comparison with a baseline
+# ----------------------------------------------------------------------------
+def get_environment():
+    """This function returns a description of the machine and versions for the results."""
+    return OrderedDict([
+        ("date", time.strftime("%Y-%m-%d %H:%M:%S")),
+        ("python", platform.python_version()),
+        ("numpy", np.__version__),
+        ("platform", platform.platform()),
+        ("processor", platform.processor()),
+        ("cpu_count", os.cpu_count()),
+    ])
+
+
+def run_benchmarks(scenarios, repeat=3, memory=True, pattern=None, verbose=True):
+    """This function runs the scenarios (whose names contain the pattern) and returns a dictionary of results."""
+    results = OrderedDict()
+    for scenario in scenarios:
+        if pattern is not None and pattern not in scenario.name:
+            continue
+        results[scenario.name] = scenario.run(repeat, memory)
+        if verbose:
+            print(format_result(scenario.name, results[scenario.name]))
+    return results
+
+
+def format_result(name, result):
+    """This function returns a line of the results table."""
+    def format_value(value, format_string):
+        return format_string % value if value is not None else "-".rjust(len(format_string % 0.0))
+    return "%-28s %9.4f s %s MB/s %s atoms/s %s MB" % (name, result["seconds"],
+                                                     format_value(result["mb_per_s"], "%8.1f"),
+                                                     format_value(result["atoms_per_s"], "%12.0f"),
+                                                     format_value(result["peak_memory_mb"], "%8.1f"))
+
+
+def save_results(filename, results, config):
+    """This function writes the results with the configuration and environment as JSON."""
+    with open(str(filename), "w") as out_file:
+        json.dump({"environment": get_environment(), "config": config, "results": results}, out_file, indent=2)
+
+
+def load_results(filename):
+    with open(str(filename), "r") as in_file:
+        return json.load(in_file)
+
+
+def check_targets(results):
+    """This function checks the throughput targets (see TARGETS) and the speedup of read_runner over the
+    line-by-line parser and returns a list of (name, value, target, passed) for scenarios in the results."""
+    checks = []
+    for name, target in TARGETS.items():
+        if name in results and results[name].get("mb_per_s"):
+            checks.append((name + " MB/s", results[name]["mb_per_s"], target, results[name]["mb_per_s"] >= target))
+    if "read_runner" in results and "read_runner_line_by_line" in results:
+        speedup = results["read_runner_line_by_line"]["seconds"]/results["read_runner"]["seconds"]
+        checks.append(("read_runner speedup", speedup, READ_RUNNER_SPEEDUP, speedup >= READ_RUNNER_SPEEDUP))
+    return checks
+
+
+def compare_results(results, baseline, tolerance=0.1):
+    """This function compares the throughput (atoms/s, or MB/s for file scenarios) of the results with the
+    results of a baseline and returns a list of (name, ratio, regression) for scenarios present in both.
+    A ratio below 1 - tolerance is a regression."""
+    baseline = baseline.get("results", baseline)
+    comparison = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        key = "mb_per_s" if result.get("mb_per_s") else "atoms_per_s"
+        if not result.get(key) or not baseline[name].get(key):
+            continue
+        ratio = result[key]/baseline[name][key]
+        comparison.append((name, ratio, ratio < 1.0 - tolerance))
+    return comparison
@@ -1,6 +1,17 @@
+from .analysis import *
+from .binary import *
+from .compression import *
 from .dataset import *
+from .descriptor import *
+from .index import *
 from .lammps import *
+from .neighbor import *
+from .profiling import *
+from .reference import *
 from .runner import *
+from .selection import *
+from .stream import *
 from .unit import *
 from .utils import *
+from .validation import *
 from .vasp import *
@@ -0,0 +1,140 @@
+from .neighbor import NeighborList, is_periodic, get_cell_matrix
+from .utils import get_number_of_processes, map_dataset_chunks
+from collections import OrderedDict
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Setup class for PairStatistics
+# ----------------------------------------------------------------------------
+class PairStatistics:
+    """A class that accumulates histograms of pair distances for each element pair over samples, e.g. of whole
+    data sets or trajectories, and gives radial distribution functions (RDF) and bond-length distributions.
+    Only the histograms and normalization factors are kept, so memory is constant while streaming over samples.
+    Pairs are found by periodic neighbor search (see NeighborList). Non-periodic samples contribute to the
+    bond-length distributions but not to the RDF, which requires a volume."""
+
+    def __init__(self, cutoff=6.0, number_of_bins=200):
+        self.cutoff = float(cutoff)
+        self.number_of_bins = int(number_of_bins)
+        self.histograms = OrderedDict()  # number of pairs in each bin for each (sorted) element pair
+        self.densities = OrderedDict()  # sum of number of pairs per volume for each element pair (RDF normalization)
+        self.min_distances = OrderedDict()  # shortest distance for each element pair
+        self.number_of_samples = 0
+
+    @property
+    def edges(self):
+        return np.linspace(0.0, self.cutoff, self.number_of_bins+1)
+
+    @property
+    def distances(self):
+        """Centers of bins."""
+        edges = self.edges
+        return 0.5*(edges[1:] + edges[:-1])
+
+    @staticmethod
+    def get_pair(symbol_i, symbol_j):
+        return (symbol_i, symbol_j) if symbol_i <= symbol_j else (symbol_j, symbol_i)
+
+    def _get_entry(self, pair):
+        if pair not in self.histograms:
+            self.histograms[pair] = np.zeros(self.number_of_bins, dtype=np.int64)
+            self.densities[pair] = 0.0
+            self.min_distances[pair] = np.inf
+        return pair
+
+    def add(self, positions, cell, codes, symbols):
+        """This method adds a sample given by positions, cell and element codes (indices into symbols)."""
+        codes = np.asarray(codes, dtype=np.int64)
+        number_of_symbols = len(symbols)
+        neighbors = NeighborList(positions, cell, self.cutoff, half=True)
+        code_i, code_j = codes[neighbors.i], codes[neighbors.j]
+        low, high = np.minimum(code_i, code_j), np.maximum(code_i, code_j)
+        bins = np.minimum((neighbors.distances*(self.number_of_bins/self.cutoff)).astype(np.int64),
+                          self.number_of_bins-1)
+        keys = low*number_of_symbols + high
+        counts = np.bincount(keys*self.number_of_bins + bins, minlength=number_of_symbols**2*self.number_of_bins)
+        counts = counts.reshape(number_of_symbols, number_of_symbols, self.number_of_bins)
+        minima = np.full(number_of_symbols**2, np.inf)
+        np.minimum.at(minima, keys, neighbors.distances)
+        atoms = np.bincount(codes, minlength=number_of_symbols)
+        volume = abs(np.linalg.det(get_cell_matrix(cell))) if is_periodic(cell) else 0.0
+        for a in range(number_of_symbols):
+            for b in range(a, number_of_symbols):
+                if atoms[a] == 0 or atoms[b] == 0:
+                    continue
+                pair = self._get_entry(self.get_pair(symbols[a], symbols[b]))
+                self.histograms[pair] += counts[a, b]
+                self.min_distances[pair] = min(self.min_distances[pair], minima[a*number_of_symbols + b])
+                if volume > 0.0:
+                    # expected number of (unordered) pairs per volume
+                    number_of_pairs = atoms[a]*(atoms[a]-1)/2.0 if a == b else float(atoms[a]*atoms[b])
+                    self.densities[pair] += number_of_pairs/volume
+        self.number_of_samples += 1
+        return self
+
+    def add_sample(self, sample):
+        """This method adds a single sample (e.g. from a streaming reader)."""
+        symbols = sorted(set(sample.symbols))
+        codes = [symbols.index(symbol) for symbol in sample.symbols]
+        return self.add(sample.positions, sample.cell, codes, symbols)
+
+    def add_samples(self, samples):
+        """This method adds an iterable of samples."""
+        for sample in samples:
+            self.add_sample(sample)
+        return self
+
+    def add_dataset(self, dataset, processes=1, chunk_size=1000):
+        """This method adds all samples of a data set. With more than one process (None means all cores)
+        chunks of samples are processed in a pool of processes and the results are merged."""
+        processes = get_number_of_processes(processes)
+        if processes > 1:
+            # results are merged as they arrive, so that memory does not grow with the data set
+            for statistics in map_dataset_chunks(compute_pair_statistics_range, dataset, chunk_size, processes,
+                                                 self.cutoff, self.number_of_bins):
+                self.merge(statistics)
+            return self
+        offsets, positions, elements, cells = dataset.offsets, dataset.positions, dataset.elements, dataset.cells
+        for index in range(dataset.number_of_samples):
+            start, stop = offsets[index], offsets[index+1]
+            self.add(positions[start:stop], cells[index], elements[start:stop], dataset.symbols)
+        return self
+
+    def merge(self, other):
+        """This method adds the accumulated statistics of another object (with the same bins)."""
+        assert (self.cutoff, self.number_of_bins) == (other.cutoff, other.number_of_bins), "Unequal bins"
+        for pair in other.histograms:
+            self._get_entry(pair)
+            self.histograms[pair] += other.histograms[pair]
+            self.densities[pair] += other.densities[pair]
+            self.min_distances[pair] = min(self.min_distances[pair], other.min_distances[pair])
+        self.number_of_samples += other.number_of_samples
+        return self
+
+    def get_rdf(self, symbol_i, symbol_j):
+        """This method returns the radial distribution function of an element pair at the bin centers."""
+        pair = self.get_pair(symbol_i, symbol_j)
+        if pair not in self.histograms or self.densities[pair] <= 0.0:
+            return np.zeros(self.number_of_bins)
+        shells = 4.0/3.0*np.pi*np.diff(self.edges**3)
+        return self.histograms[pair]/(self.densities[pair]*shells)
+
+    def get_bond_length_distribution(self, symbol_i, symbol_j):
+        """This method returns the normalized distribution (probability density) of pair distances
+        of an element pair within the cutoff radius."""
+        pair = self.get_pair(symbol_i, symbol_j)
+        histogram = self.histograms.get(pair, np.zeros(self.number_of_bins))
+        total = np.sum(histogram)
+        return histogram/(total*self.cutoff/self.number_of_bins) if total > 0 else np.zeros(self.number_of_bins)
+
+    @property
+    def pairs(self):
+        return list(self.histograms.keys())
+
+
+def compute_pair_statistics_range(arguments):
+    """This function computes the pair statistics of a chunk of samples (dataset, cutoff, number_of_bins)
+    in a worker process of PairStatistics.add_dataset, which merges the histograms and counts of all chunks."""
+    dataset, cutoff, number_of_bins = arguments
+    return PairStatistics(cutoff, number_of_bins).add_dataset(dataset)
@@ -0,0 +1,85 @@
+from .dataset import DataSet
+from .index import FrameIndex
+import json
+import os
+import shutil
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Native binary data set format
+# ----------------------------------------------------------------------------
+# A binary data set is a directory which holds one .npy file for each column of the data set
+# (see DataSet), the sample offsets, and a meta.json file with the symbol table and the
+# size/mtime of the source file (for caches).
+BINARY_FORMAT = "pynnp-binary"
+BINARY_VERSION = 1
+
+
+def write_binary(dataset, path, source=None):
+    """This function writes a data set into the binary format. The directory is written next to
+    the target and renamed at the end. An existing directory is renamed aside before and deleted only
+    after the new one is in place, so that the target is either the complete old or the complete new
+    data set (it is missing only between the two renames) and never partially written or deleted."""
+    path = str(path).rstrip(os.sep)
+    temp_path = "%s.tmp%d" % (path, os.getpid())
+    old_path = "%s.old%d" % (path, os.getpid())
+    for stale_path in (temp_path, old_path):
+        if os.path.exists(stale_path):
+            shutil.rmtree(stale_path)
+    os.makedirs(temp_path)
+    np.save(os.path.join(temp_path, "offsets.npy"), dataset.offsets)
+    for name in DataSet.ATOMIC_COLUMNS + DataSet.COLLECTIVE_COLUMNS:
+        np.save(os.path.join(temp_path, name + ".npy"), np.ascontiguousarray(getattr(dataset, name)))
+    meta = {
+        "format": BINARY_FORMAT,
+        "version": BINARY_VERSION,
+        "symbols": list(dataset.symbols),
+        "number_of_samples": dataset.number_of_samples,
+        "number_of_atoms": dataset.number_of_atoms,
+        "source": source,
+    }
+    with open(os.path.join(temp_path, "meta.json"), "w") as out_file:
+        json.dump(meta, out_file, indent=2)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(temp_path, path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+
+def read_binary_meta(path):
+    """This function returns the meta data of a binary data set."""
+    with open(os.path.join(str(path), "meta.json"), "r") as in_file:
+        meta = json.load(in_file)
+    assert meta.get("format") == BINARY_FORMAT, "Unexpected binary format"
+    assert meta.get("version") == BINARY_VERSION, "Unsupported binary format version (%s)" % meta.get("version")
+    return meta
+
+
+def read_binary(path, mmap=True):
+    """This function reads a data set from the binary format. With mmap the columns are memory-mapped
+    in copy-on-write mode: opening is near-instant, pages are shared between processes and
+    modifications stay private to the process (the files are never changed)."""
+    path = str(path)
+    meta = read_binary_meta(path)
+    mmap_mode = "c" if mmap else None
+    offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode)
+    columns = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+               for name in DataSet.ATOMIC_COLUMNS + DataSet.COLLECTIVE_COLUMNS}
+    return DataSet.from_columns(meta["symbols"], offsets, columns)
+
+
+def get_source_info(filename, uc):
+    """This function returns the information which identifies a cached source file."""
+    size, mtime = FrameIndex.get_source_stamp(filename)
+    return {"size": size, "mtime_ns": mtime, "unit_conversion": [uc.energy, uc.length, uc.charge]}
+
+
+def is_valid_cache(path, filename, uc):
+    """This function checks whether a binary cache exists and matches the source file and unit conversion."""
+    try:
+        meta = read_binary_meta(path)
+    except (OSError, ValueError, AssertionError):
+        return False
+    return meta.get("source") == get_source_info(filename, uc)
@@ -0,0 +1,125 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+
+
+# ----------------------------------------------------------------------------
+# Transparent compressed I/O
+# ----------------------------------------------------------------------------
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".lzma": "xz"}
+COMPRESSION_MAGIC = ((b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"))
+COMPRESSION_LEVELS = {"gzip": 6, "bz2": 9, "xz": 6}  # default levels (gzip as zlib, faster than gzip.open)
+THREADED_CHUNK_SIZE = 1 << 20  # size of decompressed chunks of the background thread
+
+
+def get_compression(filename, mode="rb"):
+    """This function returns the compression (gzip, bz2, xz or None) of a file. Existing files are detected
+    from their magic bytes when reading or appending and new files from the suffix (e.g. input.data.gz) when
+    writing. Appending to an existing file whose compression differs from its suffix raises an error, since
+    the appended stream would not match the existing data."""
+    suffix_compression = COMPRESSION_SUFFIXES.get(os.path.splitext(str(filename))[1].lower())
+    if "r" in mode or "a" in mode:
+        if not os.path.isfile(str(filename)) or ("a" in mode and os.path.getsize(str(filename)) == 0):
+            return suffix_compression
+        with open(str(filename), "rb") as in_file:
+            head = in_file.read(6)
+        compression = next((compression for magic, compression in COMPRESSION_MAGIC if head.startswith(magic)), None)
+        assert "a" not in mode or compression == suffix_compression, \
+            "Unexpected %s compression of %s for appending (expected %s from the suffix)" \
+            % (compression or "no", filename, suffix_compression or "none")
+        return compression
+    return suffix_compression
+
+
+def is_compressed(filename):
+    """This function returns whether an existing file is compressed (see get_compression)."""
+    return get_compression(filename, "rb") is not None
+
+
+def open_file(filename, mode="rb", level=None, threaded=True):
+    """This function opens a plain or compressed file (see get_compression) in binary or text mode like open.
+    Compressed files are read and written as streams. When reading, decompression runs in a background
+    thread which overlaps with parsing (the compression libraries release the GIL). The level of
+    compression for writing defaults to COMPRESSION_LEVELS."""
+    compression = get_compression(filename, mode)
+    if compression is None:
+        return open(str(filename), mode)
+    binary_mode = mode.replace("t", "").replace("b", "") + "b"
+    if "r" in mode:
+        raw_file = _open_compressed(compression, filename, binary_mode)
+        if threaded:
+            raw_file = io.BufferedReader(ThreadedReader(raw_file), THREADED_CHUNK_SIZE)
+    else:
+        level = COMPRESSION_LEVELS[compression] if level is None else int(level)
+        raw_file = _open_compressed(compression, filename, binary_mode, level)
+    return raw_file if "b" in mode else io.TextIOWrapper(raw_file)
+
+
+def _open_compressed(compression, filename, mode, level=None):
+    if compression == "gzip":
+        return gzip.open(str(filename), mode) if level is None else gzip.open(str(filename), mode, level)
+    if compression == "bz2":
+        return bz2.open(str(filename), mode) if level is None else bz2.open(str(filename), mode, level)
+    return lzma.open(str(filename), mode) if level is None else lzma.open(str(filename), mode, preset=level)
+
+
+class ThreadedReader(io.RawIOBase):
+    """A raw reader which reads chunks of a file object (e.g. decompressed data of gzip.open) in a background
+    thread, at most max_chunks ahead of the consumer. Errors of the thread are raised by the consumer."""
+
+    def __init__(self, in_file, chunk_size=THREADED_CHUNK_SIZE, max_chunks=8):
+        io.RawIOBase.__init__(self)
+        self._file = in_file
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(max_chunks)
+        self._stop = threading.Event()
+        self._chunk = memoryview(b"")
+        self._eof = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                chunk = self._file.read(self._chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as error:
+            self._put(error)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self._chunk) and not self._eof:
+            item = self._queue.get()
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+            self._chunk = memoryview(item)
+        n = min(len(buffer), len(self._chunk))
+        buffer[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._file.close()
+        io.RawIOBase.close(self)
@@ -1,5 +1,9 @@
 from math import sqrt
 from collections import defaultdict
+from .neighbor import NeighborList, get_min_distance, is_orthogonal, minimum_image
+from .profiling import stage
+import random
+import numpy as np
 
 
 # ----------------------------------------------------------------------------
@@ -8,6 +12,8 @@ from collections import defaultdict
 class AtomicData:
     """A class that holds atomic data such as positions, forces, total_energy, charges, etc."""
 
+    __slots__ = ("atom_id", "position", "symbol", "charge", "energy", "force")
+
     def __init__(self, atom_id=0, position=(0.0, 0.0, 0.0), symbol='X', charge=0.0, energy=0.0, force=(0.0, 0.0, 0.0)):
         self.atom_id = atom_id
         self.position = position
@@ -17,18 +23,113 @@ class AtomicData:
         self.force = force
 
 
+class AtomicView:
+    """A lightweight view of a single atom that reads and writes the columnar arrays of a data set."""
+
+    __slots__ = ("_dataset", "_index")
+
+    def __init__(self, dataset, index):
+        self._dataset = dataset
+        self._index = index  # global atom index in the data set
+
+    @property
+    def atom_id(self):
+        return int(self._dataset.atom_ids[self._index])
+
+    @atom_id.setter
+    def atom_id(self, value):
+        self._dataset.atom_ids[self._index] = value
+
+    @property
+    def position(self):
+        return self._dataset.positions[self._index]
+
+    @position.setter
+    def position(self, value):
+        self._dataset.positions[self._index] = value
+
+    @property
+    def symbol(self):
+        return self._dataset.symbols[self._dataset.elements[self._index]]
+
+    @symbol.setter
+    def symbol(self, value):
+        self._dataset.elements[self._index] = self._dataset.get_element_code(value)
+        self._dataset.invalidate_caches()
+
+    @property
+    def charge(self):
+        return float(self._dataset.charges[self._index])
+
+    @charge.setter
+    def charge(self, value):
+        self._dataset.charges[self._index] = value
+
+    @property
+    def energy(self):
+        return float(self._dataset.atomic_energies[self._index])
+
+    @energy.setter
+    def energy(self, value):
+        self._dataset.atomic_energies[self._index] = value
+
+    @property
+    def force(self):
+        return self._dataset.forces[self._index]
+
+    @force.setter
+    def force(self, value):
+        self._dataset.forces[self._index] = value
+
+
 # ----------------------------------------------------------------------------
 # Setup classes for CollectiveData
 # ----------------------------------------------------------------------------
 class CollectiveData:
     """A class that holds collective quantities of simulated system such as total energy or charge."""
 
+    __slots__ = ("cell", "total_energy", "total_charge")
+
     def __init__(self, cell=(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0), total_energy=0.0, total_charge=0.0):
         self.cell = cell
         self.total_energy = total_energy
         self.total_charge = total_charge
 
 
+class CollectiveView:
+    """A lightweight view of the collective data of a single sample stored in a data set."""
+
+    __slots__ = ("_dataset", "_index")
+
+    def __init__(self, dataset, index):
+        self._dataset = dataset
+        self._index = index  # sample index in the data set
+
+    @property
+    def cell(self):
+        return self._dataset.cells[self._index]
+
+    @cell.setter
+    def cell(self, value):
+        self._dataset.cells[self._index] = value
+
+    @property
+    def total_energy(self):
+        return float(self._dataset.total_energies[self._index])
+
+    @total_energy.setter
+    def total_energy(self, value):
+        self._dataset.total_energies[self._index] = value
+
+    @property
+    def total_charge(self):
+        return float(self._dataset.total_charges[self._index])
+
+    @total_charge.setter
+    def total_charge(self, value):
+        self._dataset.total_charges[self._index] = value
+
+
 # ----------------------------------------------------------------------------
 # Setup classes for Sample
 # ----------------------------------------------------------------------------
@@ -46,6 +147,43 @@ class SampleData:
     def number_of_atoms(self):
         return self.get_number_of_atoms()
 
+    @property
+    def atom_ids(self):
+        """This method returns an array of atom ids."""
+        return np.array([atom.atom_id for atom in self.atomic], dtype=np.int64)
+
+    @property
+    def positions(self):
+        """This method returns an array of atomic positions (number of atoms x 3)."""
+        return np.array([atom.position for atom in self.atomic], dtype=float).reshape(-1, 3)
+
+    @property
+    def forces(self):
+        """This method returns an array of atomic forces (number of atoms x 3)."""
+        return np.array([atom.force for atom in self.atomic], dtype=float).reshape(-1, 3)
+
+    @property
+    def charges(self):
+        """This method returns an array of atomic charges."""
+        return np.array([atom.charge for atom in self.atomic], dtype=float)
+
+    @property
+    def atomic_energies(self):
+        """This method returns an array of atomic energies."""
+        return np.array([atom.energy for atom in self.atomic], dtype=float)
+
+    @property
+    def symbols(self):
+        """This method returns a list of atomic symbols (element types)."""
+        return [atom.symbol for atom in self.atomic]
+
+    @property
+    def cell(self):
+        """This method returns the cell vectors as a flat array of 9 components."""
+        if self.collective is None:
+            return np.zeros(9)
+        return np.array(self.collective.cell, dtype=float)
+
     def get_total_energy(self):
         """This method returns total energy from the collective part of data set."""
         assert self.collective is None, "No total energy as collective data was found"
@@ -61,7 +199,6 @@ class SampleData:
         tot = 0.0
         for atom in self.atomic:
             tot += atom.energy
-            print (atom.energy)
         return tot
 
     def get_total_charge(self):
@@ -96,13 +233,15 @@ class SampleData:
     def distance2(self, atom_i, atom_j):
         """This method returns square of the distance between two given atoms."""
         # set distances in each direction
-        # TODO: optimize performance
         dx = atom_i.position[0] - atom_j.position[0]
         dy = atom_i.position[1] - atom_j.position[1]
         dz = atom_i.position[2] - atom_j.position[2]
-        # get cell sizes
-        # TODO: extend to non-orthogonal cell
+        # apply minimum image convention for non-orthogonal cell
         cell = self.collective.cell
+        if not is_orthogonal(cell):
+            dr = minimum_image([dx, dy, dz], cell)
+            return float(dr @ dr)
+        # get cell sizes
         lx, ly, lz = cell[0], cell[4], cell[8]
         # apply-PBC
         # x-direction
@@ -127,6 +266,38 @@ class SampleData:
         """This method returns the distance between two given atoms."""
         return sqrt(self.distance2(atom_i, atom_j))
 
+    def get_neighbor_list(self, cutoff, half=True):
+        """This method returns the list of atom pairs within the cutoff radius (see NeighborList)."""
+        return NeighborList(self.positions, self.cell, cutoff, half)
+
+    def get_min_distance(self, self_images=True):
+        """This method returns the minimum distance between atoms of the sample (including periodic images,
+        and images of the same atom unless self_images is false, see get_min_distance)."""
+        return get_min_distance(self.positions, self.cell, self_images)
+
+    def remove_atomic_energy(self, atomic_energy):
+        """This method subtracts atomic energy of each element from the total energy.
+        A KeyError is raised if an element of the sample has no atomic energy."""
+        element_number = self.get_atom_types_and_numbers()
+        for elem in element_number:
+            if elem not in atomic_energy:
+                raise KeyError("Missing atomic energy of element %s" % elem)
+        for elem in atomic_energy.keys():
+            self.collective.total_energy -= element_number[elem]*atomic_energy[elem]
+        return self
+
+    def convert_units(self, uc):
+        """This method applies the given unit conversion to the atomic and collective data in place."""
+        for atom in self.atomic:
+            atom.position = tuple(pos*uc.length for pos in atom.position)
+            atom.force = tuple(frc*uc.force for frc in atom.force)
+            atom.charge *= uc.charge
+            atom.energy *= uc.energy
+        self.collective.cell = tuple(c*uc.length for c in self.collective.cell)
+        self.collective.total_energy *= uc.energy
+        self.collective.total_charge *= uc.charge
+        return self
+
     def get_atom_types_and_numbers(self):
         """This method returns a list of atom types present in the structure."""
         atom_types_numbers = defaultdict(int)
@@ -134,36 +305,690 @@ class SampleData:
             atom_types_numbers[atom.symbol] += 1
         return atom_types_numbers
 
+
+class SampleView(SampleData):
+    """A lightweight view of a single sample whose data are stored in the columnar arrays of a data set.
+    Views are created on demand and always reflect the current content of the data set."""
+
+    def __init__(self, dataset, index):
+        self._dataset = dataset
+        self._index = index  # sample index in the data set
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def dataset(self):
+        return self._dataset
+
+    @property
+    def _slice(self):
+        offsets = self._dataset.offsets
+        return slice(offsets[self._index], offsets[self._index+1])
+
+    @property
+    def atomic(self):
+        """This method returns a list of atomic views of the sample."""
+        sl = self._slice
+        return [AtomicView(self._dataset, index) for index in range(sl.start, sl.stop)]
+
+    @property
+    def collective(self):
+        return CollectiveView(self._dataset, self._index)
+
+    def get_number_of_atoms(self):
+        offsets = self._dataset.offsets
+        return int(offsets[self._index+1] - offsets[self._index])
+
+    @property
+    def atom_ids(self):
+        return self._dataset.atom_ids[self._slice]
+
+    @property
+    def positions(self):
+        return self._dataset.positions[self._slice]
+
+    @property
+    def forces(self):
+        return self._dataset.forces[self._slice]
+
+    @property
+    def charges(self):
+        return self._dataset.charges[self._slice]
+
+    @property
+    def atomic_energies(self):
+        return self._dataset.atomic_energies[self._slice]
+
+    @property
+    def elements(self):
+        """This method returns an array of element codes (indices into the data set symbols)."""
+        return self._dataset.elements[self._slice]
+
+    @property
+    def symbols(self):
+        symbols = self._dataset.symbols
+        return [symbols[code] for code in self.elements.tolist()]
+
+    @property
+    def cell(self):
+        return self._dataset.cells[self._index]
+
+    def sum_atomic_energy(self):
+        return float(np.sum(self.atomic_energies))
+
+    def convert_units(self, uc):
+        self.positions[:] *= uc.length
+        self.forces[:] *= uc.force
+        self.charges[:] *= uc.charge
+        self.atomic_energies[:] *= uc.energy
+        self.cell[:] *= uc.length
+        collective = self.collective
+        collective.total_energy *= uc.energy
+        collective.total_charge *= uc.charge
+        return self
+
+    def sum_atomic_charge(self):
+        return float(np.sum(self.charges))
+
+    def get_atom_indices_for_symbol(self, symbol):
+        """This method returns an array of atom indices (in the data set columns) of the given symbol."""
+        if symbol not in self._dataset.symbols:
+            return np.zeros(0, dtype=np.int64)
+        return self._dataset.get_element_index().get_atom_indices(self._index, self._dataset.symbols.index(symbol))
+
+    def get_atoms_for_symbol(self, symbol):
+        return [AtomicView(self._dataset, i) for i in self.get_atom_indices_for_symbol(symbol).tolist()]
+
+    def get_number_of_atoms_for_symbol(self, symbol):
+        if symbol not in self._dataset.symbols:
+            return 0
+        return int(self._dataset.get_composition_matrix()[self._index, self._dataset.symbols.index(symbol)])
+
+    def get_atom_types_and_numbers(self):
+        atom_types_numbers = defaultdict(int)
+        element_index = self._dataset.get_element_index()
+        counts = element_index.composition[self._index]
+        codes = np.flatnonzero(counts)
+        # keep the order of first appearance in the sample
+        first_index = element_index.get_first_atom_indices(self._index, codes)
+        for i in np.argsort(first_index):
+            atom_types_numbers[self._dataset.symbols[codes[i]]] += int(counts[codes[i]])
+        return atom_types_numbers
+
+
 # ----------------------------------------------------------------------------
 # Setup classes for DataSet
 # ----------------------------------------------------------------------------
+class ElementIndex:
+    """A class that groups the atoms of a data set by sample and element. It holds the composition matrix
+    (number of atoms of each element in each sample) and the atom indices sorted by sample and element,
+    so that the atoms of an element in a sample are a contiguous range of the sorted indices."""
+
+    def __init__(self, elements, offsets, number_of_symbols):
+        n_samples = len(offsets) - 1
+        self.number_of_symbols = number_of_symbols
+        samples = np.repeat(np.arange(n_samples, dtype=np.int64), np.diff(offsets))
+        keys = samples*number_of_symbols + elements
+        # atoms of each sample are contiguous, so that a stable sort keeps them in their original order
+        self.order = np.argsort(keys, kind="stable")
+        self.composition = np.bincount(keys, minlength=n_samples*number_of_symbols)\
+            .reshape(n_samples, number_of_symbols)
+        self.group_offsets = np.concatenate([[0], np.cumsum(self.composition.ravel())])
+
+    def get_atom_indices(self, sample_index, code):
+        """This method returns the atom indices of the given element code in a sample."""
+        k = sample_index*self.number_of_symbols + code
+        return self.order[self.group_offsets[k]:self.group_offsets[k+1]]
+
+    def get_first_atom_indices(self, sample_indices, codes):
+        """This method returns the index of the first atom of given element codes in given samples
+        (the element must be present in the sample)."""
+        return self.order[self.group_offsets[np.asarray(sample_indices)*self.number_of_symbols + np.asarray(codes)]]
+
+
+class SampleList:
+    """A read-only sequence of sample views over a data set (or over the samples of given indices)."""
+
+    def __init__(self, dataset, indices=None):
+        self._dataset = dataset
+        self._indices = indices
+
+    def __len__(self):
+        return self._dataset.get_number_of_samples() if self._indices is None else len(self._indices)
+
+    def _get_view(self, index):
+        return SampleView(self._dataset, index if self._indices is None else int(self._indices[index]))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get_view(i) for i in range(len(self))[index]]
+        n_samples = len(self)
+        index = int(index)
+        if index < 0:
+            index += n_samples
+        if not 0 <= index < n_samples:
+            raise IndexError("sample index out of range")
+        return self._get_view(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._get_view(index)
+
+
 class DataSet:
-    """This class holds a collection of samples."""
+    """This class holds a collection of samples.
+
+    Atomic data of all samples are stored in contiguous arrays (columns) and each sample spans
+    the range offsets[i]:offsets[i+1] of the atomic columns. Samples (SampleData) and atoms
+    (AtomicData) are accessed through lightweight views which are created on demand."""
+
+    # atomic columns (one row per atom) and collective columns (one row per sample)
+    ATOMIC_COLUMNS = ("atom_ids", "positions", "forces", "charges", "atomic_energies", "elements")
+    COLLECTIVE_COLUMNS = ("cells", "total_energies", "total_charges")
 
     def __init__(self):
-        self.samples = []  # list of samples
+        self.symbols = []  # element symbol table, element codes are indices into this list
+        self._columns = {
+            "atom_ids": np.zeros(0, dtype=np.int64),
+            "positions": np.zeros((0, 3)),
+            "forces": np.zeros((0, 3)),
+            "charges": np.zeros(0),
+            "atomic_energies": np.zeros(0),
+            "elements": np.zeros(0, dtype=np.int32),
+            "cells": np.zeros((0, 9)),
+            "total_energies": np.zeros(0),
+            "total_charges": np.zeros(0),
+        }
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._pending = []  # blocks of appended samples which are not yet merged into the columns
+        self._element_index = None  # cached ElementIndex
+
+    def _flush(self):
+        """Merge pending blocks of appended samples into the contiguous columns."""
+        if not self._pending:
+            return
+        self.invalidate_caches()
+        blocks, self._pending = self._pending, []
+        with stage("construct"):
+            for name in self._columns:
+                self._columns[name] = np.concatenate([self._columns[name]] + [block[name] for block in blocks])
+            counts = np.concatenate([block["number_of_atoms"] for block in blocks])
+            self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(counts, dtype=np.int64)])
+
+    def consolidate(self):
+        """This method merges appended samples into the contiguous columns (which otherwise happens
+        on first access)."""
+        self._flush()
+        return self
+
+    def invalidate_caches(self):
+        """This method drops cached data derived from the columns (e.g. the element index). It is called
+        by the methods which modify the data set and has to be called after modifying elements directly."""
+        self._element_index = None
+
+    def get_element_index(self):
+        """This method returns the (cached) ElementIndex of the data set."""
+        if self._element_index is None:
+            self._element_index = ElementIndex(self.elements, self.offsets, len(self.symbols))
+        return self._element_index
+
+    def get_composition_matrix(self, symbols=None):
+        """This method returns the number of atoms of each element in each sample as a matrix
+        (number of samples x number of elements). Columns follow the symbol table of the data set
+        or the given list of symbols (missing elements are zero)."""
+        composition = self.get_element_index().composition
+        if symbols is None:
+            return composition
+        matrix = np.zeros((len(composition), len(symbols)), dtype=composition.dtype)
+        for column, symbol in enumerate(symbols):
+            if symbol in self.symbols:
+                matrix[:, column] = composition[:, self.symbols.index(symbol)]
+        return matrix
+
+    def _get_column(self, name):
+        self._flush()
+        return self._columns[name]
+
+    @property
+    def offsets(self):
+        """Array of sample offsets into the atomic columns (number of samples + 1)."""
+        self._flush()
+        return self._offsets
+
+    @property
+    def atom_ids(self):
+        return self._get_column("atom_ids")
+
+    @property
+    def positions(self):
+        return self._get_column("positions")
+
+    @property
+    def forces(self):
+        return self._get_column("forces")
+
+    @property
+    def charges(self):
+        return self._get_column("charges")
+
+    @property
+    def atomic_energies(self):
+        return self._get_column("atomic_energies")
+
+    @property
+    def elements(self):
+        return self._get_column("elements")
+
+    @property
+    def cells(self):
+        return self._get_column("cells")
+
+    @property
+    def total_energies(self):
+        return self._get_column("total_energies")
+
+    @property
+    def total_charges(self):
+        return self._get_column("total_charges")
+
+    @property
+    def samples(self):
+        """Sequence of sample views."""
+        return SampleList(self)
+
+    @samples.setter
+    def samples(self, list_of_samples):
+        """Replace the data set with the given list of samples."""
+        list_of_samples = list(list_of_samples)
+        if all(isinstance(sample, SampleView) and sample.dataset is self for sample in list_of_samples):
+            dataset = self.take([sample.index for sample in list_of_samples])
+        else:
+            dataset = DataSet()
+            for sample in list_of_samples:
+                dataset.append(sample)
+        self._replace(dataset)
+
+    @classmethod
+    def from_columns(cls, symbols, offsets, columns):
+        """This method creates a data set from a symbol table, sample offsets and a dictionary of columns.
+        Arrays are used as they are (without copy), e.g. memory-mapped arrays."""
+        dataset = cls()
+        dataset.symbols = list(symbols)
+        dataset._offsets = offsets
+        for name in cls.ATOMIC_COLUMNS + cls.COLLECTIVE_COLUMNS:
+            dataset._columns[name] = columns[name]
+        return dataset
+
+    def _replace(self, dataset):
+        """Replace the content of the data set with the content of the given one."""
+        dataset._flush()
+        self.symbols = list(dataset.symbols)
+        self._columns = dict(dataset._columns)
+        self._offsets = dataset._offsets
+        self._pending = []
+        self.invalidate_caches()
+
+    def get_element_code(self, symbol):
+        """This method returns the element code of the given symbol and adds it to the symbol table if needed."""
+        try:
+            return self.symbols.index(symbol)
+        except ValueError:
+            self.symbols.append(symbol)
+            self.invalidate_caches()
+            return len(self.symbols) - 1
+
+    def encode_symbols(self, symbols):
+        """This method converts a sequence of symbols (str or bytes) into an array of element codes."""
+        symbols = np.asarray(symbols)
+        codes = np.zeros(symbols.shape, dtype=np.int32)
+        if symbols.size == 0:
+            return codes
+        # compare against each distinct symbol and add new ones in order of their first appearance
+        masks = []
+        for symbol in set(symbols.tolist()):
+            mask = symbols == symbol
+            masks.append((int(np.argmax(mask)), symbol, mask))
+        for _, symbol, mask in sorted(masks, key=lambda item: item[0]):
+            if isinstance(symbol, bytes):
+                symbol = symbol.decode()
+            codes[mask] = self.get_element_code(str(symbol))
+        return codes
+
+    def extend_arrays(self, number_of_atoms, positions, symbols, forces=None, charges=None, atomic_energies=None,
+                      atom_ids=None, cells=None, total_energies=None, total_charges=None):
+        """This method appends a block of samples given as arrays. Atomic arrays are concatenated over
+        samples and number_of_atoms gives the number of atoms for each sample."""
+        counts = np.asarray(number_of_atoms, dtype=np.int64).reshape(-1)
+        n_samples, n_atoms = len(counts), int(np.sum(counts))
+        if atom_ids is None:
+            # one-based atom ids for each sample
+            starts = np.repeat(np.cumsum(counts) - counts, counts)
+            atom_ids = np.arange(1, n_atoms+1, dtype=np.int64) - starts
+        block = {
+            "number_of_atoms": counts,
+            "atom_ids": np.asarray(atom_ids, dtype=np.int64).reshape(n_atoms),
+            "positions": np.asarray(positions, dtype=float).reshape(n_atoms, 3),
+            "forces": np.zeros((n_atoms, 3)) if forces is None else np.asarray(forces, dtype=float).reshape(n_atoms, 3),
+            "charges": np.zeros(n_atoms) if charges is None else np.asarray(charges, dtype=float).reshape(n_atoms),
+            "atomic_energies": np.zeros(n_atoms) if atomic_energies is None
+                else np.asarray(atomic_energies, dtype=float).reshape(n_atoms),
+            "elements": self.encode_symbols(symbols).reshape(n_atoms),
+            "cells": np.zeros((n_samples, 9)) if cells is None else np.asarray(cells, dtype=float).reshape(n_samples, 9),
+            "total_energies": np.zeros(n_samples) if total_energies is None
+                else np.asarray(total_energies, dtype=float).reshape(n_samples),
+            "total_charges": np.zeros(n_samples) if total_charges is None
+                else np.asarray(total_charges, dtype=float).reshape(n_samples),
+        }
+        self._pending.append(block)
+        return self
 
     def append(self, new_sample):
         """Append a sample to the list of samples."""
         assert isinstance(new_sample, SampleData), "Unexpected sample type"
-        self.samples.append(new_sample)
+        collective = new_sample.collective
+        self.extend_arrays([new_sample.number_of_atoms], new_sample.positions, new_sample.symbols,
+                           forces=new_sample.forces, charges=new_sample.charges,
+                           atomic_energies=new_sample.atomic_energies, atom_ids=new_sample.atom_ids,
+                           cells=new_sample.cell,
+                           total_energies=0.0 if collective is None else collective.total_energy,
+                           total_charges=0.0 if collective is None else collective.total_charge)
+        return self
+
+    def extend(self, dataset):
+        """Append all samples of another data set."""
+        assert isinstance(dataset, DataSet), "Unexpected data set type"
+        self.extend_arrays(dataset.get_number_of_atoms_per_sample(), dataset.positions,
+                           np.asarray(dataset.symbols, dtype=str)[dataset.elements],
+                           forces=dataset.forces, charges=dataset.charges,
+                           atomic_energies=dataset.atomic_energies, atom_ids=dataset.atom_ids,
+                           cells=dataset.cells, total_energies=dataset.total_energies,
+                           total_charges=dataset.total_charges)
+        return self
+
+    def get_atom_indices(self, list_of_indices):
+        """This method returns the indices of atoms (in the atomic columns) for the given sample indices."""
+        offsets = self.offsets
+        list_of_indices = np.asarray(list_of_indices, dtype=np.int64).reshape(-1)
+        counts = (offsets[1:] - offsets[:-1])[list_of_indices]
+        starts = offsets[:-1][list_of_indices]
+        new_starts = np.cumsum(counts) - counts
+        return np.repeat(starts - new_starts, counts) + np.arange(int(np.sum(counts)), dtype=np.int64)
+
+    def take(self, list_of_indices):
+        """This method returns a new data set which contains the samples of given indices (zero-index-based)."""
+        n_samples = self.number_of_samples
+        list_of_indices = np.asarray(list_of_indices, dtype=np.int64).reshape(-1)
+        list_of_indices = np.where(list_of_indices < 0, list_of_indices + n_samples, list_of_indices)
+        if np.any((list_of_indices < 0) | (list_of_indices >= n_samples)):
+            raise IndexError("sample index out of range")
+        atom_indices = self.get_atom_indices(list_of_indices)
+        dataset = DataSet()
+        dataset.symbols = list(self.symbols)
+        for name in self.ATOMIC_COLUMNS:
+            dataset._columns[name] = self._columns[name][atom_indices]
+        for name in self.COLLECTIVE_COLUMNS:
+            dataset._columns[name] = self._columns[name][list_of_indices]
+        counts = self.get_number_of_atoms_per_sample()[list_of_indices]
+        dataset._offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        return dataset
+
+    def view(self, list_of_indices=None):
+        """This method returns a view of the samples of given indices (default is all samples) without copying
+        sample data (see DataSetView)."""
+        return DataSetView(self, list_of_indices)
+
+    def remove_atomic_energy(self, atomic_energy):
+        """This method subtracts atomic energy of each element (dictionary) from the total energies.
+        A KeyError is raised if an element of the data set has no atomic energy (nothing is changed)."""
+        present = np.any(self.get_composition_matrix() > 0, axis=0)
+        for symbol in np.asarray(self.symbols, dtype=object)[present]:
+            if symbol not in atomic_energy:
+                raise KeyError("Missing atomic energy of element %s" % symbol)
+        symbols = list(atomic_energy.keys())
+        composition = self.get_composition_matrix(symbols)
+        total_energies = self.total_energies
+        for column, symbol in enumerate(symbols):
+            total_energies -= composition[:, column]*atomic_energy[symbol]
         return self
 
     def get_number_of_samples(self):
-        return len(self.samples)
+        return len(self.offsets) - 1
 
     @property
     def number_of_samples(self):
         return self.get_number_of_samples()
 
+    def get_number_of_atoms(self):
+        """This method returns total number of atoms in the data set."""
+        return int(self.offsets[-1])
+
+    @property
+    def number_of_atoms(self):
+        return self.get_number_of_atoms()
+
+    def get_number_of_atoms_per_sample(self):
+        """This method returns an array of number of atoms for each sample."""
+        offsets = self.offsets
+        return offsets[1:] - offsets[:-1]
+
     def get_atom_types_numbers(self):
         """This method returns a list of atom types present in the dataset."""
         atom_types_numbers = defaultdict(float)
-        # add number of atom types for each sample
-        for sample in self.samples:
-            for atom_type, atom_number in sample.get_atom_types_and_numbers().items():
-                atom_types_numbers[atom_type] += atom_number
+        element_index = self.get_element_index()
+        composition = element_index.composition
+        counts = np.sum(composition, axis=0)
+        codes = np.flatnonzero(counts)
+        # add number of atom types in order of first appearance
+        first_index = element_index.get_first_atom_indices(np.argmax(composition[:, codes] > 0, axis=0), codes)
+        for i in np.argsort(first_index):
+            atom_types_numbers[self.symbols[codes[i]]] += float(counts[codes[i]])
         # normalize to the number of samples
         for key in atom_types_numbers:
             atom_types_numbers[key] /= self.number_of_samples
         return atom_types_numbers
+
+
+class DataSetView:
+    """A subset of samples of a data set given by an array of sample indices, which does not copy sample data.
+    Views are chained (select, delete, sample and filter return new views of the same data set) and combined
+    by set operations (union, intersection, difference and complement, also as operators |, &, - and ~).
+    Samples are views into the data set, so that e.g. train, validation and test splits are kept side by side
+    without copies. Columns are gathered from the data set on access, so views can be used wherever a data
+    set is read (I/O, error analysis, fitting, etc.) and take (or to_dataset) gives an independent data set.
+
+    Example:
+        view = adaptor.dataset.view()
+        train = view.sample(800, seed=1)
+        validation = (~train).filter(lambda sample: sample.number_of_atoms < 100)
+    """
+
+    def __init__(self, dataset, list_of_indices=None):
+        assert isinstance(dataset, DataSet), "Unexpected data set type"
+        self.parent = dataset
+        n_samples = dataset.number_of_samples
+        if list_of_indices is None:
+            self.indices = np.arange(n_samples, dtype=np.int64)
+        else:
+            self.indices = self._get_indices(list_of_indices, n_samples)
+
+    @staticmethod
+    def _get_indices(list_of_indices, n_samples):
+        """Convert sample indices (or a boolean mask) into an array of non-negative indices."""
+        if isinstance(list_of_indices, (int, np.integer)):
+            list_of_indices = [list_of_indices]
+        list_of_indices = np.asarray(list_of_indices)
+        if list_of_indices.dtype == bool:
+            assert len(list_of_indices) == n_samples, "Unexpected length of mask"
+            return np.flatnonzero(list_of_indices)
+        list_of_indices = list_of_indices.astype(np.int64).reshape(-1)
+        list_of_indices = np.where(list_of_indices < 0, list_of_indices + n_samples, list_of_indices)
+        if np.any((list_of_indices < 0) | (list_of_indices >= n_samples)):
+            raise IndexError("sample index out of range")
+        return list_of_indices
+
+    def _new(self, indices):
+        view = DataSetView.__new__(DataSetView)
+        view.parent = self.parent
+        view.indices = indices
+        return view
+
+    # --- chaining ---
+    def select(self, list_of_indices):
+        """This method returns a view of the samples of given indices (zero-based, relative to this view)
+        or of a boolean mask over the samples of this view."""
+        return self._new(self.indices[self._get_indices(list_of_indices, len(self.indices))])
+
+    def view(self, list_of_indices=None):
+        """This method returns a view of the samples of given indices (default is all samples) like DataSet.view."""
+        return self if list_of_indices is None else self.select(list_of_indices)
+
+    def delete(self, list_of_indices):
+        """This method returns a view without the samples of given indices (relative to this view)."""
+        mask = np.ones(len(self.indices), dtype=bool)
+        mask[self._get_indices(list_of_indices, len(self.indices))] = False
+        return self._new(self.indices[mask])
+
+    def sample(self, number_of_samples=1, seed=1234):
+        """This method returns a view of randomly but uniquely selected samples (the same samples as
+        RunnerAdaptor.sample for the same seed)."""
+        assert int(number_of_samples) <= len(self.indices), "Unexpected number of samples"
+        list_of_indices = list(range(len(self.indices)))
+        random.Random(int(seed)).shuffle(list_of_indices)
+        return self.select(list_of_indices[:int(number_of_samples)])
+
+    def filter(self, condition):
+        """This method returns a view of the samples which fulfill the condition, given as a boolean mask over
+        the samples of this view or a function of a sample (e.g. lambda sample: sample.number_of_atoms < 100)."""
+        if callable(condition):
+            condition = np.fromiter((bool(condition(sample)) for sample in self.samples), dtype=bool,
+                                    count=len(self.indices))
+        return self.select(np.asarray(condition, dtype=bool))
+
+    # --- set operations (results are in the order of the data set) ---
+    @property
+    def mask(self):
+        """Boolean mask of the samples of the view over all samples of the data set."""
+        mask = np.zeros(self.parent.number_of_samples, dtype=bool)
+        mask[self.indices] = True
+        return mask
+
+    def _get_mask(self, other):
+        assert isinstance(other, DataSetView) and other.parent is self.parent, "Views of different data sets"
+        return other.mask
+
+    def union(self, other):
+        return self._new(np.flatnonzero(self.mask | self._get_mask(other)))
+
+    def intersection(self, other):
+        return self._new(np.flatnonzero(self.mask & self._get_mask(other)))
+
+    def difference(self, other):
+        return self._new(np.flatnonzero(self.mask & ~self._get_mask(other)))
+
+    def complement(self):
+        """This method returns a view of all samples of the data set which are not in this view."""
+        return self._new(np.flatnonzero(~self.mask))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __invert__ = complement
+
+    # --- read access like DataSet ---
+    @property
+    def symbols(self):
+        return self.parent.symbols
+
+    @property
+    def samples(self):
+        """Sequence of sample views (into the data set)."""
+        return SampleList(self.parent, self.indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def get_number_of_samples(self):
+        return len(self.indices)
+
+    @property
+    def number_of_samples(self):
+        return self.get_number_of_samples()
+
+    def get_number_of_atoms_per_sample(self):
+        return self.parent.get_number_of_atoms_per_sample()[self.indices]
+
+    def get_number_of_atoms(self):
+        return int(np.sum(self.get_number_of_atoms_per_sample()))
+
+    @property
+    def number_of_atoms(self):
+        return self.get_number_of_atoms()
+
+    @property
+    def offsets(self):
+        return np.concatenate([[0], np.cumsum(self.get_number_of_atoms_per_sample(), dtype=np.int64)])
+
+    def get_atom_indices(self, list_of_indices=None):
+        """This method returns the indices of atoms (in the atomic columns of the data set) for the given sample
+        indices relative to this view (default is all samples)."""
+        indices = self.indices if list_of_indices is None \
+            else self.indices[self._get_indices(list_of_indices, len(self.indices))]
+        return self.parent.get_atom_indices(indices)
+
+    def _get_column(self, name):
+        """Gather a column of the samples of the view (a copy of only the selected rows)."""
+        if name in DataSet.ATOMIC_COLUMNS:
+            return self.parent._get_column(name)[self.parent.get_atom_indices(self.indices)]
+        return self.parent._get_column(name)[self.indices]
+
+    @property
+    def atom_ids(self):
+        return self._get_column("atom_ids")
+
+    @property
+    def positions(self):
+        return self._get_column("positions")
+
+    @property
+    def forces(self):
+        return self._get_column("forces")
+
+    @property
+    def charges(self):
+        return self._get_column("charges")
+
+    @property
+    def atomic_energies(self):
+        return self._get_column("atomic_energies")
+
+    @property
+    def elements(self):
+        return self._get_column("elements")
+
+    @property
+    def cells(self):
+        return self._get_column("cells")
+
+    @property
+    def total_energies(self):
+        return self._get_column("total_energies")
+
+    @property
+    def total_charges(self):
+        return self._get_column("total_charges")
+
+    def get_composition_matrix(self, symbols=None):
+        return self.parent.get_composition_matrix(symbols)[self.indices]
+
+    def take(self, list_of_indices):
+        """This method returns a new data set which contains the samples of given indices (relative to this view)."""
+        return self.parent.take(self.indices[self._get_indices(list_of_indices, len(self.indices))])
+
+    def to_dataset(self):
+        """This method returns a new data set (copy) of the samples of the view."""
+        return self.parent.take(self.indices)
+
+    def __repr__(self):
+        return "DataSetView(%d of %d samples)" % (len(self.indices), self.parent.number_of_samples)
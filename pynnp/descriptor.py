@@ -0,0 +1,230 @@
+from .neighbor import NeighborList
+from .utils import get_number_of_processes, map_dataset_chunks
+from collections import OrderedDict
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Atom-centered symmetry functions (Behler-Parrinello)
+# ----------------------------------------------------------------------------
+def cutoff_function(distances, rcutoff):
+    """This function returns the cosine cutoff function 0.5*(cos(pi*r/rc) + 1) for r < rc (zero otherwise)."""
+    return np.where(distances < rcutoff, 0.5*(np.cos(np.pi*distances/rcutoff) + 1.0), 0.0)
+
+
+class SymmetryFunction:
+    """A class that holds the definition of an element-resolved symmetry function (as in RuNNer/n2p2 input.nn):
+    radial G2 (type 2), narrow angular G4 (type 3) or wide angular G5 (type 9)."""
+
+    __slots__ = ("element", "type", "neighbors", "eta", "rshift", "rcutoff", "lambd", "zeta")
+
+    TYPES = (2, 3, 9)
+
+    def __init__(self, element, type, neighbors, eta, rcutoff, rshift=0.0, lambd=1.0, zeta=1.0):
+        assert type in self.TYPES, "Unsupported symmetry function type %s (expected 2, 3 or 9)" % type
+        self.element = element  # central atom
+        self.type = type
+        self.neighbors = tuple(neighbors)  # one neighbor element (radial) or two (angular)
+        self.eta = float(eta)
+        self.rshift = float(rshift)
+        self.rcutoff = float(rcutoff)
+        self.lambd = float(lambd)
+        self.zeta = float(zeta)
+
+    @classmethod
+    def from_line(cls, line):
+        """This method creates a symmetry function from a symfunction_short line of input.nn, e.g.
+        "symfunction_short O 2 H 0.001 0.0 12.0" or "symfunction_short O 3 H H 0.001 1.0 2.0 12.0"."""
+        items = line.split("#")[0].split()
+        assert items[0] == "symfunction_short", "Expected symfunction_short line"
+        element, type = items[1], int(items[2])
+        if type == 2:
+            neighbor, eta, rshift, rcutoff = items[3], float(items[4]), float(items[5]), float(items[6])
+            return cls(element, type, [neighbor], eta, rcutoff, rshift)
+        neighbor_1, neighbor_2 = items[3], items[4]
+        eta, lambd, zeta, rcutoff = [float(item) for item in items[5:9]]
+        rshift = float(items[9]) if len(items) > 9 else 0.0
+        return cls(element, type, [neighbor_1, neighbor_2], eta, rcutoff, rshift, lambd, zeta)
+
+    def __repr__(self):
+        return "SymmetryFunction(%s, %d, %s, eta=%g, rshift=%g, rcutoff=%g, lambd=%g, zeta=%g)" \
+            % (self.element, self.type, "-".join(self.neighbors), self.eta, self.rshift, self.rcutoff,
+               self.lambd, self.zeta)
+
+
+def read_symmetry_functions(filename="input.nn"):
+    """This function reads the symmetry function definitions (symfunction_short lines) of a RuNNer/n2p2 input file."""
+    functions = []
+    with open(str(filename), "r") as in_file:
+        for line in in_file:
+            if line.split("#")[0].strip().startswith("symfunction_short"):
+                functions.append(SymmetryFunction.from_line(line))
+    return functions
+
+
+def _sum_rows(index, values, number_of_rows):
+    """Sum rows of values with the same (sorted) index."""
+    result = np.zeros((number_of_rows, values.shape[1]))
+    if len(index):
+        starts = np.flatnonzero(np.concatenate([[True], index[1:] != index[:-1]]))
+        result[index[starts]] = np.add.reduceat(values, starts, axis=0)
+    return result
+
+
+def iter_triplets(index, rcutoff_mask, block_size=1 << 20):
+    """This function yields pairs (p, q) with p < q of neighbor list entries of the same central atom,
+    given the central atom index of each entry (sorted) and a mask of entries to use. Pairs are yielded in blocks
+    of whole central atoms with about block_size pairs, so that memory is limited for dense structures."""
+    entries = np.flatnonzero(rcutoff_mask)
+    index = index[entries]
+    if len(index) == 0:
+        return
+    # number of following entries of the same central atom
+    number = np.searchsorted(index, index, side="right") - np.arange(len(index)) - 1
+    first = np.flatnonzero(np.concatenate([[True], index[1:] != index[:-1]]))
+    before = (np.cumsum(number) - number)[first]
+    bounds = np.append(first[np.flatnonzero(np.diff(before // block_size, prepend=-1))], len(index))
+    for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        block = number[start:stop]
+        total = int(np.sum(block))
+        p = np.repeat(np.arange(start, stop), block)
+        q = p + 1 + np.arange(total) - np.repeat(np.cumsum(block) - block, block)
+        yield entries[p], entries[q]
+
+
+class SymmetryFunctionSet:
+    """A class that computes element-resolved atom-centered symmetry functions of structures. All pairs and
+    triplets of a structure (within the largest cutoff radius of the neighbor list) are evaluated in batch for
+    all functions with the same central and neighbor elements.
+
+    Example:
+        symmetry_functions = SymmetryFunctionSet.from_file("input.nn")
+        values = symmetry_functions.compute_dataset(adaptor.dataset, processes=4)
+        values["O"]  # number of O atoms in the data set x number of O functions
+    """
+
+    def __init__(self, functions):
+        self.functions = list(functions)
+        self.elements = list(OrderedDict.fromkeys(function.element for function in self.functions))
+
+    @classmethod
+    def from_file(cls, filename="input.nn"):
+        return cls(read_symmetry_functions(filename))
+
+    @property
+    def cutoff(self):
+        return max([function.rcutoff for function in self.functions], default=0.0)
+
+    def get_functions(self, element):
+        """This method returns the list of functions of a central element (in the order of definition)."""
+        return [function for function in self.functions if function.element == element]
+
+    def _get_groups(self, symbols):
+        """Group functions of each central element by type and neighbor elements (as element codes of symbols)."""
+        groups = OrderedDict()
+        for element in self.elements:
+            for column, function in enumerate(self.get_functions(element)):
+                if element not in symbols or any(neighbor not in symbols for neighbor in function.neighbors):
+                    continue
+                neighbors = tuple(sorted(symbols.index(neighbor) for neighbor in function.neighbors))
+                key = (symbols.index(element), function.type, neighbors)
+                groups.setdefault(key, []).append((column, function))
+        return groups
+
+    def compute(self, positions, cell, codes, symbols):
+        """This method computes the symmetry functions of a structure given by positions, cell and element codes
+        (indices into symbols). It returns a dictionary of arrays (atoms of each central element in the order of
+        the structure x functions of the element)."""
+        codes = np.asarray(codes, dtype=np.int64)
+        n_atoms, number_of_symbols = len(codes), len(symbols)
+        values = {element: np.zeros((n_atoms, len(self.get_functions(element)))) for element in self.elements}
+        neighbors = NeighborList(positions, cell, self.cutoff, half=False)
+        i, j, distances, vectors = neighbors.i, neighbors.j, neighbors.distances, neighbors.vectors
+        code_i, code_j = codes[i], codes[j]
+        angular_groups = []
+        for (center, function_type, neighbor_codes), group in self._get_groups(list(symbols)).items():
+            columns = [column for column, _ in group]
+            eta = np.array([function.eta for _, function in group])
+            rshift = np.array([function.rshift for _, function in group])
+            rcutoff = np.array([function.rcutoff for _, function in group])
+            if function_type == 2:
+                mask = (code_i == center) & (code_j == neighbor_codes[0])
+                r = distances[mask][:, None]
+                terms = np.exp(-eta*(r - rshift)**2)*cutoff_function(r, rcutoff)
+                values[symbols[center]][:, columns] += _sum_rows(i[mask], terms, n_atoms)
+                continue
+            # the radial part of angular functions factorizes into terms of the pairs ij and ik
+            r = distances[:, None]
+            radial = np.exp(-eta*(r - rshift)**2)*cutoff_function(r, rcutoff)
+            lambd = np.array([function.lambd for _, function in group])
+            zeta = np.array([function.zeta for _, function in group])
+            key = (center*number_of_symbols + neighbor_codes[0])*number_of_symbols + neighbor_codes[1]
+            angular_groups.append((key, symbols[center], function_type, columns, eta, rshift, rcutoff, lambd, zeta,
+                                   radial))
+        if not angular_groups:
+            return self._get_central_values(values, codes, symbols)
+        angular_cutoff = max(function.rcutoff for function in self.functions if function.type != 2)
+        narrow = any(function.type == 3 for function in self.functions)
+        for p, q in iter_triplets(i, distances < angular_cutoff):
+            cos_theta = np.einsum("ij,ij->i", vectors[p], vectors[q])/(distances[p]*distances[q])
+            r_jk = np.linalg.norm(vectors[q] - vectors[p], axis=1) if narrow else None
+            keys = (code_i[p]*number_of_symbols + np.minimum(code_j[p], code_j[q]))*number_of_symbols \
+                + np.maximum(code_j[p], code_j[q])
+            for key, element, function_type, columns, eta, rshift, rcutoff, lambd, zeta, radial in angular_groups:
+                mask = np.flatnonzero(keys == key)
+                if len(mask) == 0:
+                    continue
+                p_group, q_group = p[mask], q[mask]
+                terms = 2.0**(1.0 - zeta)*np.maximum(1.0 + lambd*cos_theta[mask][:, None], 0.0)**zeta \
+                    * radial[p_group]*radial[q_group]
+                if function_type == 3:
+                    r = r_jk[mask][:, None]
+                    terms *= np.exp(-eta*(r - rshift)**2)*cutoff_function(r, rcutoff)
+                values[element][:, columns] += _sum_rows(i[p_group], terms, n_atoms)
+        return self._get_central_values(values, codes, symbols)
+
+    def _get_central_values(self, values, codes, symbols):
+        """Keep only atoms of each central element."""
+        return {element: values[element][codes == symbols.index(element)] if element in symbols
+                else np.zeros((0, len(self.get_functions(element)))) for element in self.elements}
+
+    def compute_sample(self, sample):
+        """This method computes the symmetry functions of a single sample (see compute)."""
+        symbols = list(OrderedDict.fromkeys(sample.symbols))
+        codes = [symbols.index(symbol) for symbol in sample.symbols]
+        return self.compute(sample.positions, sample.cell, codes, symbols)
+
+    def compute_dataset(self, dataset, processes=1, chunk_size=200):
+        """This method computes the symmetry functions of all samples of a data set and returns a dictionary of
+        arrays (all atoms of each central element in the order of the data set x functions of the element).
+        With more than one process (None means all cores) chunks of samples are computed in a pool of processes."""
+        processes = get_number_of_processes(processes)
+        if processes > 1:
+            # chunks are copied lazily, only the computed values are collected
+            results = list(map_dataset_chunks(compute_symmetry_functions_range, dataset, chunk_size, processes, self))
+        else:
+            offsets, positions, elements, cells = dataset.offsets, dataset.positions, dataset.elements, dataset.cells
+            results = [self.compute(positions[offsets[index]:offsets[index+1]], cells[index],
+                                    elements[offsets[index]:offsets[index+1]], dataset.symbols)
+                       for index in range(dataset.number_of_samples)]
+        return OrderedDict((element, np.concatenate([result[element] for result in results])
+                            if results else np.zeros((0, len(self.get_functions(element)))))
+                           for element in self.elements)
+
+    def get_statistics(self, values):
+        """This method returns minimum, maximum, mean and standard deviation of each symmetry function
+        (as in RuNNer scaling.data) for a dictionary of values (see compute_dataset)."""
+        statistics = OrderedDict()
+        for element, array in values.items():
+            if len(array) == 0:
+                continue
+            statistics[element] = {"min": np.min(array, axis=0), "max": np.max(array, axis=0),
+                                   "mean": np.mean(array, axis=0), "std": np.std(array, axis=0)}
+        return statistics
+
+
+def compute_symmetry_functions_range(arguments):
+    """This function computes the symmetry functions of a chunk of samples (dataset, symmetry function set)
+    in a worker process of SymmetryFunctionSet.compute_dataset, which concatenates the values of all chunks."""
+    dataset, symmetry_functions = arguments
+    return symmetry_functions.compute_dataset(dataset)
@@ -0,0 +1,275 @@
+from .dataset import DataSet
+from .unit import UnitConversion
+from collections import OrderedDict
+import io
+import json
+import os
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Byte ranges of files aligned to frames
+# ----------------------------------------------------------------------------
+class FileRange(io.RawIOBase):
+    """A read-only binary file object over the byte range [start, stop) of a file.
+    It can be wrapped by io.BufferedReader and io.TextIOWrapper like a regular file."""
+
+    def __init__(self, filename, start, stop):
+        io.RawIOBase.__init__(self)
+        self._file = open(str(filename), "rb")
+        self._file.seek(start)
+        self._remaining = stop - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        number_of_bytes = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= number_of_bytes
+        return number_of_bytes
+
+    def close(self):
+        self._file.close()
+        io.RawIOBase.close(self)
+
+
+def split_file_into_frames(filename, number_of_ranges, frame_pattern, block_size=1 << 20):
+    """This function splits a file into (at most) the given number of byte ranges which start at the
+    beginning of a frame. The compiled pattern must match a newline followed by the first line of a frame
+    (e.g. "begin" in RuNNer or "ITEM: TIMESTEP" in LAMMPS files)."""
+    size = os.path.getsize(str(filename))
+    boundaries = [0]
+    with open(str(filename), "rb") as in_file:
+        for k in range(1, max(1, int(number_of_ranges))):
+            position = max(size*k//number_of_ranges, boundaries[-1])
+            # include the preceding newline in case the position is at the beginning of a line
+            position = max(position - 1, 0)
+            in_file.seek(position)
+            boundary = size
+            tail = b""
+            while True:
+                chunk = in_file.read(block_size)
+                if not chunk:
+                    break
+                data = tail + chunk
+                match = frame_pattern.search(data)
+                if match:
+                    boundary = position - len(tail) + match.start() + 1
+                    break
+                tail = data[-64:]
+                position += len(chunk)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+# ----------------------------------------------------------------------------
+# Setup class for FrameIndex
+# ----------------------------------------------------------------------------
+class FrameIndex:
+    """A class that holds byte offsets, lengths and number of atoms of the frames in a structure file.
+    The size and modification time of the source file are kept to detect outdated indices."""
+
+    def __init__(self, offsets=(), lengths=(), number_of_atoms=(), source_size=0, source_mtime=0):
+        self.offsets = np.asarray(offsets, dtype=np.int64)  # byte offset of the first line of each frame
+        self.lengths = np.asarray(lengths, dtype=np.int64)  # number of bytes of each frame
+        self.number_of_atoms = np.asarray(number_of_atoms, dtype=np.int64)
+        self.source_size = int(source_size)
+        self.source_mtime = int(source_mtime)  # in nanoseconds
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def number_of_frames(self):
+        return len(self)
+
+    @staticmethod
+    def get_source_stamp(filename):
+        """This method returns size and modification time (ns) of the given file."""
+        stat = os.stat(str(filename))
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_valid_for(self, filename):
+        """This method checks whether the index matches the current state of the given source file."""
+        return (self.source_size, self.source_mtime) == self.get_source_stamp(filename)
+
+    def save(self, filename):
+        """This method writes the index into a sidecar file (npz format)."""
+        with open(str(filename), "wb") as out_file:
+            np.savez(out_file, offsets=self.offsets, lengths=self.lengths, number_of_atoms=self.number_of_atoms,
+                     source=np.array([self.source_size, self.source_mtime], dtype=np.int64))
+        return self
+
+    @classmethod
+    def load(cls, filename):
+        """This method reads an index from a sidecar file (npz format)."""
+        with np.load(str(filename)) as data:
+            return cls(data["offsets"], data["lengths"], data["number_of_atoms"], *data["source"].tolist())
+
+    def read_frames(self, in_file, list_of_indices):
+        """This method reads the frames of given (sorted) indices from a file opened in binary mode
+        and returns them as a single block of bytes. Adjacent frames are read at once."""
+        list_of_indices = np.asarray(list_of_indices, dtype=np.int64)
+        if len(list_of_indices) == 0:
+            return b""
+        starts = self.offsets[list_of_indices]
+        stops = starts + self.lengths[list_of_indices]
+        # merge ranges of adjacent frames
+        breaks = np.flatnonzero(starts[1:] != stops[:-1]) + 1
+        chunks = []
+        for start, stop in zip(starts[np.concatenate([[0], breaks])].tolist(),
+                               stops[np.concatenate([breaks - 1, [len(stops) - 1]])].tolist()):
+            in_file.seek(start)
+            chunks.append(in_file.read(stop - start))
+        return b"".join(chunks)
+
+
+# ----------------------------------------------------------------------------
+# Setup class for FileSummary
+# ----------------------------------------------------------------------------
+class FileSummary:
+    """A class that holds summary statistics of the samples in a structure file (number of samples and atoms,
+    number of atoms of each element, ranges of per-atom total energies and force components) in the units
+    of the file. Like FrameIndex, the size and modification time of the source file are kept to detect
+    outdated summaries, and summaries are updated incrementally when samples are appended (see update)."""
+
+    def __init__(self, number_of_samples=0, number_of_atoms=0, elements=None, energy_min=None, energy_max=None,
+                 force_min=None, force_max=None, source_size=0, source_mtime=0):
+        self.number_of_samples = int(number_of_samples)
+        self.number_of_atoms = int(number_of_atoms)
+        self.elements = OrderedDict() if elements is None else OrderedDict(elements)  # symbol -> number of atoms
+        self.energy_min = energy_min  # total energy per atom
+        self.energy_max = energy_max
+        self.force_min = force_min  # force components
+        self.force_max = force_max
+        self.source_size = int(source_size)
+        self.source_mtime = int(source_mtime)  # in nanoseconds
+
+    @property
+    def range_of_energy(self):
+        return None if self.energy_min is None else self.energy_max - self.energy_min
+
+    @property
+    def range_of_force(self):
+        return None if self.force_min is None else self.force_max - self.force_min
+
+    def update(self, dataset, uc=UnitConversion()):
+        """This method adds the samples of a data set (or view) which are written with the unit conversion."""
+        if dataset.number_of_samples == 0:
+            return self
+        self.number_of_samples += dataset.number_of_samples
+        self.number_of_atoms += dataset.number_of_atoms
+        for symbol, count in zip(dataset.symbols, np.sum(dataset.get_composition_matrix(), axis=0).tolist()):
+            if count:
+                self.elements[symbol] = self.elements.get(symbol, 0) + int(count)
+        energies = dataset.total_energies*uc.energy/np.maximum(dataset.get_number_of_atoms_per_sample(), 1)
+        self.energy_min = min(float(np.min(energies)), self.energy_min if self.energy_min is not None else np.inf)
+        self.energy_max = max(float(np.max(energies)), self.energy_max if self.energy_max is not None else -np.inf)
+        if dataset.number_of_atoms:
+            forces = dataset.forces*uc.force
+            self.force_min = min(float(np.min(forces)), self.force_min if self.force_min is not None else np.inf)
+            self.force_max = max(float(np.max(forces)), self.force_max if self.force_max is not None else -np.inf)
+        return self
+
+    def is_valid_for(self, filename):
+        """This method checks whether the summary matches the current state of the given source file."""
+        return (self.source_size, self.source_mtime) == FrameIndex.get_source_stamp(filename)
+
+    def to_dict(self):
+        return OrderedDict([
+            ("number_of_samples", self.number_of_samples),
+            ("number_of_atoms", self.number_of_atoms),
+            ("elements", self.elements),
+            ("energy_min", self.energy_min),
+            ("energy_max", self.energy_max),
+            ("force_min", self.force_min),
+            ("force_max", self.force_max),
+            ("source_size", self.source_size),
+            ("source_mtime", self.source_mtime),
+        ])
+
+    def save(self, filename):
+        """This method writes the summary into a sidecar file (JSON format)."""
+        with open(str(filename), "w") as out_file:
+            json.dump(self.to_dict(), out_file, indent=2)
+        return self
+
+    @classmethod
+    def load(cls, filename):
+        """This method reads a summary from a sidecar file (JSON format)."""
+        with open(str(filename), "r") as in_file:
+            return cls(**json.load(in_file, object_pairs_hook=OrderedDict))
+
+    def __repr__(self):
+        return "FileSummary(samples=%d, atoms=%d, elements=%s, energy=[%s, %s], force=[%s, %s])" \
+            % (self.number_of_samples, self.number_of_atoms, dict(self.elements), self.energy_min, self.energy_max,
+               self.force_min, self.force_max)
+
+
+# ----------------------------------------------------------------------------
+# Setup class for LazyDataSet
+# ----------------------------------------------------------------------------
+class LazyDataSet(DataSet):
+    """A data set over a subset of frames of a structure file which are parsed only when atomic
+    or collective data are accessed for the first time. Selecting samples (take) before that only
+    changes the subset of frames, so memory is proportional to the selected samples."""
+
+    def __init__(self, filename, index, parser, uc=UnitConversion()):
+        DataSet.__init__(self)
+        self.filename = str(filename)
+        self.index = index
+        self.parser = parser  # function which converts a block of frames (bytes) to arrays
+        self.uc = uc
+        self.selection = np.arange(len(index), dtype=np.int64)  # frame indices of the samples
+        self._loaded = False
+
+    @property
+    def is_loaded(self):
+        return self._loaded
+
+    def _flush(self):
+        if not self._loaded:
+            self._loaded = True
+            pending, self._pending = self._pending, []
+            # read frames in file order and rearrange them into the order of selection
+            order = np.argsort(self.selection, kind="stable")
+            with open(self.filename, "rb") as in_file:
+                data = self.index.read_frames(in_file, self.selection[order])
+            dataset = DataSet()
+            dataset.extend_arrays(**self.parser(data, self.uc))
+            inverse = np.empty_like(order)
+            inverse[order] = np.arange(len(order))
+            self._replace(dataset.take(inverse))
+            self._pending = pending
+        DataSet._flush(self)
+
+    def get_number_of_samples(self):
+        if not self._loaded:
+            return len(self.selection) + sum(len(block["number_of_atoms"]) for block in self._pending)
+        return DataSet.get_number_of_samples(self)
+
+    def get_number_of_atoms_per_sample(self):
+        if not self._loaded and not self._pending:
+            return self.index.number_of_atoms[self.selection]
+        return DataSet.get_number_of_atoms_per_sample(self)
+
+    def get_number_of_atoms(self):
+        return int(np.sum(self.get_number_of_atoms_per_sample()))
+
+    def take(self, list_of_indices):
+        if self._loaded or self._pending:
+            return DataSet.take(self, list_of_indices)
+        n_samples = len(self.selection)
+        list_of_indices = np.asarray(list_of_indices, dtype=np.int64).reshape(-1)
+        list_of_indices = np.where(list_of_indices < 0, list_of_indices + n_samples, list_of_indices)
+        if np.any((list_of_indices < 0) | (list_of_indices >= n_samples)):
+            raise IndexError("sample index out of range")
+        dataset = LazyDataSet(self.filename, self.index, self.parser, self.uc)
+        dataset.selection = self.selection[list_of_indices]
+        return dataset
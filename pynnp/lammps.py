@@ -1,7 +1,245 @@
 from .runner import RunnerAdaptor
-from .dataset import SampleData
-from .dataset import AtomicData, CollectiveData
+from .dataset import DataSet
+from .compression import is_compressed, open_file
+from .index import FileRange, split_file_into_frames
+from .profiling import is_profiling, report_progress, stage, timed
 from .unit import UnitConversion
+from .utils import get_number_of_processes, iter_parallel_map, write_buffered
+from collections import deque
+from itertools import islice
+import io
+import os
+import re
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Parsing of LAMMPS dump file format
+# ----------------------------------------------------------------------------
+_LAMMPS_TIMESTEP = re.compile(rb"\nITEM: TIMESTEP")
+
+# Candidate names of the columns in "ITEM: ATOMS" header (the first one found is used).
+# Positions can be wrapped (x), unwrapped (xu) or scaled (xs, xsu) coordinates.
+LAMMPS_COLUMNS = {
+    "id": ("id",),
+    "element": ("element",),
+    "type": ("type",),
+    "position": (("x", "y", "z"), ("xu", "yu", "zu"), ("xs", "ys", "zs"), ("xsu", "ysu", "zsu")),
+    "charge": ("q",),
+    "energy": ("c_e0", "pot", "c_pe", "c_pot", "c_eatom", "c_epot", "v_pe", "pe"),
+    "force": (("fx", "fy", "fz"),),
+}
+
+
+def get_lammps_columns(header, columns=None):
+    """This function maps the quantities of LAMMPS_COLUMNS to column indices of the given "ITEM: ATOMS"
+    header (list of column names). The optional dictionary columns overrides the names of quantities,
+    e.g. {"energy": "c_1", "position": ("xu", "yu", "zu")}. Missing quantities are mapped to None."""
+    header = [name.decode() if isinstance(name, bytes) else name for name in header]
+    candidates = dict(LAMMPS_COLUMNS)
+    if columns is not None:
+        for quantity, names in columns.items():
+            assert quantity in LAMMPS_COLUMNS, "Unknown quantity %s (expected one of %s)" \
+                % (quantity, ", ".join(LAMMPS_COLUMNS))
+            candidates[quantity] = (tuple(names) if isinstance(names, (list, tuple)) else names,)
+    mapping = {}
+    for quantity, names in candidates.items():
+        mapping[quantity] = None
+        for name in names:
+            if isinstance(name, tuple) and all(n in header for n in name):
+                mapping[quantity] = [header.index(n) for n in name]
+                break
+            elif name in header:
+                mapping[quantity] = header.index(name)
+                break
+    assert mapping["position"] is not None, "No atomic positions found in LAMMPS dump header"
+    assert mapping["element"] is not None or mapping["type"] is not None, \
+        "No atom types found in LAMMPS dump header"
+    return mapping
+
+
+def get_lammps_cell(box_header, bounds):
+    """This function returns the cell matrix (rows are lattice vectors) and origin of a LAMMPS box
+    from the "ITEM: BOX BOUNDS" header and its three lines of bounds (and tilt factors xy xz yz)."""
+    bounds = np.array(bounds, dtype=float)
+    lo, hi = bounds[:, 0].copy(), bounds[:, 1].copy()
+    xy = xz = yz = 0.0
+    if len(box_header) >= 3 and box_header[:3] in ([b"xy", b"xz", b"yz"], ["xy", "xz", "yz"]):
+        xy, xz, yz = bounds[:, 2].tolist()
+        # bounding box of the triclinic cell is written instead of the cell boundaries
+        lo[0] -= min(0.0, xy, xz, xy+xz)
+        hi[0] -= max(0.0, xy, xz, xy+xz)
+        lo[1] -= min(0.0, yz)
+        hi[1] -= max(0.0, yz)
+    cell = np.array([[hi[0]-lo[0], 0.0, 0.0],
+                     [xy, hi[1]-lo[1], 0.0],
+                     [xz, yz, hi[2]-lo[2]]])
+    return cell, lo
+
+
+def convert_lammps_atoms(lines, header, box_header, bounds, symbol_dict=None, uc=UnitConversion(), mapping=None):
+    """This function converts the atom lines (bytes) of a single LAMMPS frame into a dictionary of arrays
+    (see DataSet.extend_arrays). All lines are tokenized and converted to floats at once."""
+    if mapping is None:
+        mapping = get_lammps_columns(header)
+    number_of_atoms = len(lines)
+    number_of_columns = len(header)
+    with stage("tokenize"):
+        tokens = b" ".join(lines).split()
+        assert len(tokens) == number_of_atoms*number_of_columns, "Unexpected number of columns in LAMMPS dump"
+        # remove text columns (in descending order so that indices of other columns are kept)
+        text = {}
+        numeric = list(range(number_of_columns))
+        for column in sorted({mapping[name] for name in ("element", "type") if mapping[name] is not None},
+                             reverse=True):
+            text[column] = tokens[column::number_of_columns]
+            del tokens[column::number_of_columns]
+            numeric.remove(column)
+        values = np.array(tokens, dtype=float).reshape(number_of_atoms, len(numeric))
+    with stage("convert"):
+        return _convert_lammps_values(values, numeric, text, header, box_header, bounds, symbol_dict, uc, mapping)
+
+
+def _convert_lammps_values(values, numeric, text, header, box_header, bounds, symbol_dict, uc, mapping):
+    """Convert numeric and text columns of the atoms of a LAMMPS frame into a dictionary of arrays."""
+    number_of_atoms = len(values)
+
+    def get(quantity, scale=1.0):
+        column = mapping[quantity]
+        if column is None:
+            return None
+        if isinstance(column, list):
+            return values[:, [numeric.index(c) for c in column]]*scale
+        return values[:, numeric.index(column)]*scale
+
+    # atomic symbols from element names or (mapped) atom types
+    if mapping["element"] is not None:
+        symbols = text[mapping["element"]]
+    else:
+        symbols = text[mapping["type"]]
+        if symbol_dict is not None:
+            lookup = {}
+            for symbol in set(symbols):
+                key = symbol.decode()
+                lookup[symbol] = symbol_dict[key] if key in symbol_dict else symbol_dict[int(key)]
+            symbols = [lookup[symbol] for symbol in symbols]
+    # positions and cell
+    cell, origin = get_lammps_cell(box_header, bounds)
+    positions = get("position")
+    if header[mapping["position"][0]] in (b"xs", b"xsu", "xs", "xsu"):
+        positions = origin + np.dot(positions, cell)
+    zeros = np.zeros(number_of_atoms)
+    charges = get("charge", uc.charge)
+    energies = get("energy", uc.energy)
+    forces = get("force", uc.force)
+    atom_ids = get("id")
+    charges = zeros if charges is None else charges
+    energies = zeros if energies is None else energies
+    # collective data are summed up from atomic data
+    return {"number_of_atoms": [number_of_atoms], "positions": positions*uc.length, "symbols": symbols,
+            "forces": np.zeros((number_of_atoms, 3)) if forces is None else forces,
+            "charges": charges, "atomic_energies": energies,
+            "atom_ids": np.arange(1, number_of_atoms+1) if atom_ids is None else atom_ids.astype(np.int64),
+            "cells": cell.ravel()*uc.length, "total_energies": sum(energies.tolist()),
+            "total_charges": sum(charges.tolist())}
+
+
+def iter_lammps_frames(filename, symbol_dict=None, uc=UnitConversion(), columns=None, start=0, stop=None, stride=1):
+    """This function iterates over frames of a LAMMPS atomic dump and yields a dictionary of arrays
+    for each frame (see DataSet.extend_arrays). See parse_lammps_frames for the arguments."""
+    with open_file(filename, 'rb') as in_file:
+        for frame in parse_lammps_frames(in_file, symbol_dict, uc, columns, start, stop, stride):
+            yield frame
+
+
+def _count_bytes(lines, read_bytes):
+    """Yield lines and add their length to read_bytes[0]."""
+    for line in lines:
+        read_bytes[0] += len(line)
+        yield line
+
+
+def parse_lammps_frames(in_file, symbol_dict=None, uc=UnitConversion(), columns=None, start=0, stop=None,
+                        stride=1):
+    """This function parses frames of a LAMMPS atomic dump from a file opened in binary mode.
+    Columns are taken from the "ITEM: ATOMS" header (see get_lammps_columns), orthogonal and triclinic
+    boxes are supported. Only frames start, start+stride, ... before stop are converted, the atom lines
+    of other frames are skipped without tokenizing and reading ends at stop."""
+    assert start >= 0 and stride >= 1, "Expected non-negative start and positive stride"
+    profiling = is_profiling()
+    # bytes are counted from the lines, since compressed files cannot tell their position
+    read_bytes, position = [0], 0
+    if profiling:
+        in_file = _count_bytes(in_file, read_bytes)
+    n_frame = -1
+    mapping, mapped_header = None, None
+    for line in in_file:
+        if not line.startswith(b"ITEM: TIMESTEP"):
+            continue
+        n_frame += 1
+        if stop is not None and n_frame >= stop:
+            break
+        # read header items up to the atoms (unknown items such as "ITEM: TIME" are ignored)
+        number_of_atoms, box_header, bounds = 0, [], None
+        for line in in_file:
+            if line.startswith(b"ITEM: NUMBER OF ATOMS"):
+                number_of_atoms = int(next(in_file))
+            elif line.startswith(b"ITEM: BOX BOUNDS"):
+                box_header = line.split()[3:]
+                bounds = [next(in_file).split() for _ in range(3)]
+            elif line.startswith(b"ITEM: ATOMS"):
+                header = line.split()[2:]
+                break
+        else:
+            raise AssertionError("Unexpected end of LAMMPS dump")
+        if n_frame < start or (n_frame - start) % stride != 0:
+            deque(islice(in_file, number_of_atoms), maxlen=0)
+            continue
+        with stage("read"):
+            lines = list(islice(in_file, number_of_atoms))
+        assert len(lines) == number_of_atoms, "Unexpected end of LAMMPS dump"
+        if header != mapped_header:
+            mapping, mapped_header = get_lammps_columns(header, columns), header
+        frame = convert_lammps_atoms(lines, header, box_header, bounds, symbol_dict, uc, mapping)
+        if profiling:
+            report_progress("read_lammps", read_bytes[0] - position, 1, number_of_atoms)
+            position = read_bytes[0]
+        yield frame
+
+
+def format_lammps_sample(timestep, sample, symbol_dict, uc=UnitConversion()):
+    """This function returns a single sample as a frame of LAMMPS atomic dump (id x y z type q c_e0 fx fy fz).
+    All atoms are formatted at once from the arrays of the sample."""
+    number_of_atoms = sample.number_of_atoms
+    rows = np.empty((number_of_atoms, 10), dtype=object)
+    rows[:, 0] = np.arange(1, number_of_atoms+1).tolist()
+    rows[:, 1:4] = sample.positions*uc.length
+    rows[:, 4] = [symbol_dict[symbol] for symbol in sample.symbols]
+    rows[:, 5] = sample.charges*uc.charge
+    rows[:, 6] = sample.atomic_energies*uc.energy
+    rows[:, 7:10] = sample.forces*uc.force
+    return "ITEM: TIMESTEP\n%d\nITEM: NUMBER OF ATOMS\n%d\nITEM: BOX BOUNDS pp pp pp\n" % (timestep, number_of_atoms) \
+        + "0 %s\n0 %s\n0 %s\n" % tuple((sample.cell[[0, 4, 8]]*uc.length).tolist()) \
+        + "ITEM: ATOMS id x y z type q c_e0 fx fy fz\n" \
+        + "%d %s %s %s %s %s %s %s %s %s\n"*number_of_atoms % tuple(rows.ravel().tolist())
+
+
+def read_lammps_range(arguments):
+    """This function reads the frames in a byte range (filename, start, stop, symbol_dict, uc, columns) of
+    a LAMMPS atomic dump into a data set in a worker process of RuNNerAdaptorForLAMMPS.read_lammps, where the
+    ranges are split at "ITEM: TIMESTEP" lines."""
+    filename, start, stop, symbol_dict, uc, columns = arguments
+    dataset = DataSet()
+    with io.BufferedReader(FileRange(filename, start, stop)) as in_file:
+        for frame in parse_lammps_frames(in_file, symbol_dict, uc, columns):
+            dataset.extend_arrays(**frame)
+    return dataset.consolidate()
+
+
+def iter_lammps(filename, symbol_dict=None, uc=UnitConversion(), columns=None, start=0, stop=None, stride=1):
+    """This function iterates over the samples of a LAMMPS atomic dump without loading the whole file."""
+    for frame in iter_lammps_frames(filename, symbol_dict, uc, columns, start, stop, stride):
+        yield DataSet().extend_arrays(**frame).samples[0]
 
 
 # ----------------------------------------------------------------------------
@@ -13,80 +251,38 @@ class RuNNerAdaptorForLAMMPS(RunnerAdaptor):
     def __init__(self):
         RunnerAdaptor.__init__(self)
 
-    def read_lammps(self, filename, symbol_dict=None, uc=UnitConversion()):
-        """This method reads LAMMPS atomic dump (id x y z type q pot fx fy fz)."""
-        with open(str(filename), 'r') as in_file:
-            # loop over lines in file
-            for line in in_file:
-                # create a instance of sample data
-                sample = SampleData()
-                # number of steps
-                line = next(in_file)
-                steps = int(line.split()[0])
-                # number of atoms
-                next(in_file)
-                line = next(in_file)
-                number_of_atoms = int(line.split()[0])
-                # read cell sizes
-                # TODO: read non-orthogonal cell in lammps
-                cell = []
-                line = next(in_file)
-                for n in range(9):
-                    if n in [0, 4, 8]:
-                        line = next(in_file)
-                        line = line.rstrip("/n").split()
-                        cell.append((float(line[1]) - float(line[0]))*uc.length)
-                    else:
-                        cell.append(0.0)
-                # read atomic positions, symbol, charge, forces, energy, etc.
-                line = next(in_file)
-                for n in range(number_of_atoms):
-                    line = next(in_file).rstrip("/n").split()
-                    atomid = int(line[0])
-                    position = [float(pos)*uc.length for pos in line[1:4]]
-                    symbol = line[4]
-                    charge = float(line[5])*uc.charge
-                    energy = float(line[6])*uc.energy
-                    force = [float(frc)*uc.force for frc in line[7:10]]
-                    # convert number to an atomic symbol
-                    if symbol_dict is not None:
-                        symbol = symbol_dict[symbol]
-                    # create atomic data and append it to sample
-                    sample.atomic.append(AtomicData(atomid, position, symbol, charge, energy, force))
-                # set collective data
-                sample.collective = CollectiveData(cell, sample.sum_atomic_energy(), sample.sum_atomic_charge())
-                # add sample to DataSet (list of samples)
-                self.dataset.append(sample)
+    @timed
+    def read_lammps(self, filename, symbol_dict=None, uc=UnitConversion(), processes=1, columns=None,
+                    start=0, stop=None, stride=1):
+        """This method reads LAMMPS atomic dump. Columns are mapped from the "ITEM: ATOMS" header
+        (e.g. id type x y z q c_e0 fx fy fz) and can be overridden by columns (see get_lammps_columns).
+        Only frames start, start+stride, ... before stop are read.
+        With more than one process (None means all cores) the file is split into byte ranges aligned
+        to frames which are parsed in a pool of processes and merged in the original order.
+        A selection of frames is read in a single process, since frames are counted from the beginning,
+        and so are compressed files (which are decompressed in a background thread, see open_file)."""
+        processes = get_number_of_processes(processes)
+        compressed = is_compressed(filename)
+        report_progress("read_lammps", total_bytes=None if compressed else os.path.getsize(str(filename)))
+        if processes > 1 and (start, stop, stride) == (0, None, 1) and not compressed:
+            ranges = split_file_into_frames(filename, 4*processes, _LAMMPS_TIMESTEP)
+            arguments = [(str(filename), start, stop, symbol_dict, uc, columns) for start, stop in ranges]
+            for (start, stop), dataset in zip(ranges, iter_parallel_map(read_lammps_range, arguments, processes)):
+                with stage("construct"):
+                    self.dataset.extend(dataset)
+                report_progress("read_lammps", stop - start, dataset.number_of_samples, dataset.number_of_atoms)
+            return self
+        for frame in iter_lammps_frames(filename, symbol_dict, uc, columns, start, stop, stride):
+            with stage("construct"):
+                self.dataset.extend_arrays(**frame)
         # return object
         return self
 
-    def write_lammps(self, filename="nnp.data", symbol_dict=None, uc=UnitConversion()):
+    def write_lammps(self, filename="nnp.data", symbol_dict=None, uc=UnitConversion(), compression_level=None):
         """A method that writes lammps input data."""
         """This method writes data set into POSCAR file format (VASP package)."""
-        with open(filename, 'w') as out_file:
-            # loop over all samples in the data set
-            for n_frame, sample in enumerate(self.dataset.samples):
-                # frame
-                out_file.write(f"ITEM: TIMESTEP\n{n_frame}\n")
-                # number of atoms
-                out_file.write(f"ITEM: NUMBER OF ATOMS\n{sample.number_of_atoms}\n")
-                # cell
-                out_file.write(f"ITEM: BOX BOUNDS pp pp pp\n")
-                for i in [0, 4, 8]:
-                    out_file.write(f"{0} {sample.collective.cell[i]*uc.length}\n")
-                # atomic data
-                out_file.write(f"ITEM: ATOMS id x y z type q c_e0 fx fy fz\n")
-                for aid, atom in enumerate(sample.atomic):
-                    pos = [pos*uc.length for pos in atom.position]
-                    frc = [frc*uc.force for frc in atom.force]
-                    out_file.write(f"{aid+1} {pos[0]} {pos[1]} {pos[2]} "
-                                   f"{symbol_dict[atom.symbol]} "
-                                   f"{atom.charge*uc.charge} {atom.energy*uc.energy} "
-                                   f"{frc[0]} {frc[1]} {frc[2]}\n")
-                    # out_file.write(f"{aid+1} {aid+1} "
-                    #                f"{symbol_dict[atom.symbol]} "
-                    #                f"{atom.charge * uc.charge} "
-                    #                f"{pos[0]} {pos[1]} {pos[2]} "
-                    #                f"0 0 0\n")
+        with open_file(filename, 'w', compression_level) as out_file:
+            write_buffered(out_file, (format_lammps_sample(n_frame, sample, symbol_dict, uc)
+                                      for n_frame, sample in enumerate(self.dataset.samples)))
         # return object
         return self
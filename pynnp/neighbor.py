@@ -0,0 +1,204 @@
+from itertools import product
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Cell and periodic boundary conditions
+# ----------------------------------------------------------------------------
+def get_cell_matrix(cell):
+    """This function returns the cell as a 3x3 matrix whose rows are the lattice vectors."""
+    return np.asarray(cell, dtype=float).reshape(3, 3)
+
+
+def is_periodic(cell):
+    """This function checks whether the given cell spans a non-zero volume."""
+    return abs(np.linalg.det(get_cell_matrix(cell))) > 1E-12
+
+
+def is_orthogonal(cell):
+    """This function checks whether the given cell is orthogonal (all off-diagonal components are zero)."""
+    matrix = get_cell_matrix(cell)
+    return not np.any(matrix - np.diag(np.diag(matrix)))
+
+
+def minimum_image(vectors, cell):
+    """This function returns the minimum image of displacement vectors (n x 3) for a general
+    (triclinic) cell. Vectors are left unchanged for a non-periodic (zero) cell."""
+    vectors = np.asarray(vectors, dtype=float)
+    if not is_periodic(cell):
+        return vectors.copy()
+    matrix = get_cell_matrix(cell)
+    fractional = vectors @ np.linalg.inv(matrix)
+    reduced = (fractional - np.round(fractional)) @ matrix
+    # rounding fractional coordinates is not exact for skewed cells, so check the neighboring images
+    images = np.array(list(product((-1, 0, 1), repeat=3)), dtype=float) @ matrix
+    candidates = reduced[..., None, :] + images
+    closest = np.argmin(np.sum(candidates**2, axis=-1), axis=-1)
+    return np.take_along_axis(candidates, closest[..., None, None], axis=-2)[..., 0, :]
+
+
+# ----------------------------------------------------------------------------
+# Setup class for NeighborList
+# ----------------------------------------------------------------------------
+class NeighborList:
+    """A class that holds the pairs of atoms within a cutoff radius under periodic boundary conditions.
+
+    Pairs are found by linked-cell binning in fractional coordinates, which works for any triclinic
+    cell and also for cutoffs larger than the cell (periodic images of the same atom are included).
+    For each pair (i, j) the displacement vector is positions[j] + shifts @ cell - positions[i].
+    A half list contains each pair only once, a full list contains both (i, j) and (j, i)."""
+
+    def __init__(self, positions, cell, cutoff, half=True):
+        self.cutoff = float(cutoff)
+        self.half = half
+        self.i, self.j, self.shifts, self.vectors = _find_pairs(positions, cell, self.cutoff, half)
+        self.distances = np.sqrt(np.sum(self.vectors**2, axis=1))
+
+    def __len__(self):
+        return len(self.i)
+
+    @property
+    def number_of_pairs(self):
+        return len(self)
+
+    def get_neighbors(self, index):
+        """This method returns indices and distances of the neighbors of the given atom."""
+        if self.half:
+            mask_i, mask_j = self.i == index, self.j == index
+            return np.concatenate([self.j[mask_i], self.i[mask_j]]), \
+                np.concatenate([self.distances[mask_i], self.distances[mask_j]])
+        mask = self.i == index
+        return self.j[mask], self.distances[mask]
+
+
+# largest number of candidate pairs (atoms^2 x periodic images) which are checked at once without binning
+BRUTE_FORCE_PAIRS = 1 << 20
+
+
+def _find_pairs_brute_force(wrapped, matrix, cutoff, images, half):
+    """Check all pairs of atoms in all periodic images at once (for small systems)."""
+    shifts = np.array(list(product(*[range(-m, m+1) for m in images.tolist()])), dtype=np.int64)
+    translations = shifts @ matrix
+    # pairs (i, j) with i <= j, the other half follows from (j, i, -shift)
+    pair_i, pair_j = np.triu_indices(len(wrapped))
+    differences = wrapped[pair_j] - wrapped[pair_i]
+    # squared distances |d + t|^2 = |d|^2 + 2 d.t + |t|^2 of all pairs and images
+    distances2 = np.einsum("pk,pk->p", differences, differences)[:, None] + 2.0*(differences @ translations.T) \
+        + np.einsum("sk,sk->s", translations, translations)
+    keep = distances2 < cutoff*cutoff
+    # shifts are in lexicographic order: images of the same atom are kept for positive shifts only
+    keep[pair_i == pair_j, :len(shifts)//2 + 1] = False
+    p, s = np.nonzero(keep)
+    i, j, shifts, vectors = pair_i[p], pair_j[p], shifts[s], differences[p] + translations[s]
+    if half:
+        return i, j, shifts, vectors
+    return np.concatenate([i, j]), np.concatenate([j, i]), np.concatenate([shifts, -shifts]), \
+        np.concatenate([vectors, -vectors])
+
+
+def _find_pairs_binned(fractional, wrapped, matrix, spacing, cutoff):
+    """Search pairs of atoms in neighboring bins of the cell (linked cells)."""
+    n_atoms = len(fractional)
+    # bins are at least as wide as the cutoff (perpendicular to the cell faces) where possible
+    n_bins = np.maximum(1, np.floor(spacing / cutoff)).astype(np.int64)
+    n_bins = np.minimum(n_bins, max(1, int(np.ceil(2.0*n_atoms**(1.0/3.0)))))
+    layers = np.ceil(cutoff*n_bins/spacing).astype(np.int64)
+    bins = np.minimum((fractional*n_bins).astype(np.int64), n_bins - 1)
+    bin_index = np.ravel_multi_index(bins.T, n_bins)
+    order = np.argsort(bin_index, kind="stable")
+    counts = np.bincount(bin_index, minlength=int(np.prod(n_bins)))
+    starts = np.cumsum(counts) - counts
+    atom_index = np.arange(n_atoms, dtype=np.int64)
+    list_i, list_j, list_shifts, list_vectors = [], [], [], []
+    for offset in product(*[range(-m, m+1) for m in layers.tolist()]):
+        target = bins + np.array(offset, dtype=np.int64)
+        shifts = np.floor_divide(target, n_bins)
+        target_index = np.ravel_multi_index((target - shifts*n_bins).T, n_bins)
+        number = counts[target_index]
+        total = int(np.sum(number))
+        if total == 0:
+            continue
+        i = np.repeat(atom_index, number)
+        j = order[np.repeat(starts[target_index] - (np.cumsum(number) - number), number) + np.arange(total)]
+        shifts = np.repeat(shifts, number, axis=0)
+        vectors = wrapped[j] + shifts @ matrix - wrapped[i]
+        keep = np.sum(vectors**2, axis=1) < cutoff*cutoff
+        # exclude an atom with itself in the same image
+        keep &= (i != j) | np.any(shifts != 0, axis=1)
+        list_i.append(i[keep])
+        list_j.append(j[keep])
+        list_shifts.append(shifts[keep])
+        list_vectors.append(vectors[keep])
+    if not list_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros((0, 3), dtype=np.int64), np.zeros((0, 3))
+    return np.concatenate(list_i), np.concatenate(list_j), np.concatenate(list_shifts), np.concatenate(list_vectors)
+
+
+def _find_pairs(positions, cell, cutoff, half):
+    """Return atom indices, integer cell shifts and displacement vectors of all pairs within the cutoff."""
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    n_atoms = len(positions)
+    empty = np.zeros(0, dtype=np.int64)
+    if n_atoms == 0 or cutoff <= 0.0:
+        return empty, empty, np.zeros((0, 3), dtype=np.int64), np.zeros((0, 3))
+    if is_periodic(cell):
+        matrix = get_cell_matrix(cell)
+        origin = np.zeros(3)
+    else:
+        # a box which is large enough that no periodic image is within the cutoff
+        origin = positions.min(axis=0)
+        matrix = np.diag(positions.max(axis=0) - origin + 2.0*cutoff + 1.0)
+    # wrap atoms into the cell
+    fractional = (positions - origin) @ np.linalg.inv(matrix)
+    wrap = np.floor(fractional)
+    fractional -= wrap
+    wrapped = fractional @ matrix
+    # distances between opposite faces of the cell and number of periodic images within the cutoff
+    spacing = abs(np.linalg.det(matrix)) / np.linalg.norm(np.cross(matrix[[1, 2, 0]], matrix[[2, 0, 1]]), axis=1)
+    images = np.ceil(cutoff/spacing).astype(np.int64)
+    if n_atoms*n_atoms*int(np.prod(2*images + 1)) <= BRUTE_FORCE_PAIRS:
+        i, j, shifts, vectors = _find_pairs_brute_force(wrapped, matrix, cutoff, images, half)
+    else:
+        i, j, shifts, vectors = _find_pairs_binned(fractional, wrapped, matrix, spacing, cutoff)
+    if len(i) == 0:
+        return empty, empty, np.zeros((0, 3), dtype=np.int64), np.zeros((0, 3))
+    # shifts with respect to the original (unwrapped) positions
+    shifts = (shifts - wrap[j] + wrap[i]).astype(np.int64)
+    if half:
+        # keep (i, j) with i < j, and periodic images of the same atom with a positive shift
+        first_nonzero = np.take_along_axis(shifts, np.argmax(shifts != 0, axis=1)[:, None], axis=1)[:, 0]
+        keep = (i < j) | ((i == j) & (first_nonzero > 0))
+        i, j, shifts, vectors = i[keep], j[keep], shifts[keep], vectors[keep]
+    sort = np.lexsort((j, i))
+    return i[sort], j[sort], shifts[sort], vectors[sort]
+
+
+def get_min_distance(positions, cell, self_images=True):
+    """This function returns the minimum distance between atoms (including periodic images).
+    With self_images the distance of an atom to its own periodic images counts as well, which is
+    the shortest distance in small cells (e.g. a single atom in a cell gives the shortest lattice vector).
+    Otherwise only pairs of different atoms are considered.
+    The cutoff of the neighbor search is increased until a pair is found."""
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    if len(positions) == 0:
+        return 1E3
+    matrix = get_cell_matrix(cell)
+    extent = np.linalg.norm(positions.max(axis=0) - positions.min(axis=0))
+    if is_periodic(cell):
+        volume = abs(np.linalg.det(matrix))
+        max_cutoff = extent + np.max(np.linalg.norm(matrix, axis=1))
+    else:
+        volume = np.prod(positions.max(axis=0) - positions.min(axis=0))
+        max_cutoff = extent
+    # start from the typical nearest neighbor distance
+    cutoff = max((volume/len(positions))**(1.0/3.0), 1E-3*max_cutoff, 1E-6)
+    while True:
+        neighbors = NeighborList(positions, cell, cutoff, half=True)
+        distances = neighbors.distances if self_images else neighbors.distances[neighbors.i != neighbors.j]
+        if len(distances) > 0:
+            return float(np.min(distances))
+        if cutoff > max_cutoff:
+            # no pairs, e.g. a single atom without periodic boundary conditions
+            return 1E3
+        cutoff *= 2.0
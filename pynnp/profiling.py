@@ -0,0 +1,215 @@
+from collections import OrderedDict
+import functools
+import time
+
+
+# ----------------------------------------------------------------------------
+# Opt-in instrumentation (stage timers and progress callbacks)
+# ----------------------------------------------------------------------------
+_profilers = []  # active profilers (nested profile contexts all collect the same events)
+
+
+class Progress:
+    """A class that holds the cumulative progress of a task (e.g. read_runner) which is passed to
+    progress callbacks."""
+
+    __slots__ = ("task", "bytes", "frames", "atoms", "total_bytes", "start_time", "elapsed")
+
+    def __init__(self, task, total_bytes=None):
+        self.task = task
+        self.bytes = 0
+        self.frames = 0
+        self.atoms = 0
+        self.total_bytes = total_bytes
+        self.start_time = time.perf_counter()  # time of the first report of the task
+        self.elapsed = 0.0
+
+    @property
+    def fraction(self):
+        """Fraction of processed bytes (None if the total is unknown)."""
+        return self.bytes/self.total_bytes if self.total_bytes else None
+
+    @property
+    def mb_per_s(self):
+        return self.bytes/1e6/self.elapsed if self.elapsed > 0.0 else 0.0
+
+    @property
+    def atoms_per_s(self):
+        return self.atoms/self.elapsed if self.elapsed > 0.0 else 0.0
+
+    def __repr__(self):
+        fraction = "" if self.fraction is None else " (%.1f%%)" % (100.0*self.fraction)
+        return "%s: %d frames, %d atoms, %.1f MB%s in %.1f s, %.1f MB/s, %.0f atoms/s" \
+            % (self.task, self.frames, self.atoms, self.bytes/1e6, fraction, self.elapsed, self.mb_per_s,
+               self.atoms_per_s)
+
+
+def print_progress(progress):
+    """This function is a progress callback which prints the progress of a task."""
+    print(progress, flush=True)
+
+
+class Profiler:
+    """A class that collects a timing report of stages (e.g. read, tokenize, convert, construct, format, write)
+    and the progress of tasks (bytes, frames and atoms) while it is active as a context manager.
+    Instrumented functions only check whether a profiler is active, so that overhead is negligible otherwise.
+    Tasks report their start (with the total number of bytes if known) and then the progress after each block
+    or frame. The optional callback is called with a Progress object whenever a task makes progress, at most once
+    per interval (in seconds) for each task and once at the end.
+    Work done in worker processes is reported as progress of the task but not in stage timers.
+
+    Example:
+        with profile(callback=print_progress, interval=10.0) as profiler:
+            adaptor = RunnerAdaptor().read_runner("input.data")
+            adaptor.write_runner("output.data")
+        print(profiler.format_report())
+    """
+
+    def __init__(self, callback=None, interval=1.0):
+        self.callback = callback
+        self.interval = interval
+        self.timers = OrderedDict()  # stage -> [seconds, number of calls]
+        self.tasks = OrderedDict()  # task -> Progress
+        self.wall_time = 0.0
+        self._start_time = None
+        self._last_callback = {}
+
+    def __enter__(self):
+        self._start_time = time.perf_counter()
+        _profilers.append(self)
+        return self
+
+    def __exit__(self, *args):
+        _profilers.remove(self)
+        self.wall_time += time.perf_counter() - self._start_time
+        # report the final state of each task
+        if self.callback is not None:
+            for task, progress in self.tasks.items():
+                if progress.frames and self._last_callback.get(task) != progress.elapsed:
+                    self.callback(progress)
+        return False
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [seconds, 1]
+        else:
+            timer[0] += seconds
+            timer[1] += 1
+
+    def add_progress(self, task, bytes=0, frames=0, atoms=0, total_bytes=None):
+        progress = self.tasks.get(task)
+        if progress is None:
+            progress = self.tasks[task] = Progress(task, total_bytes)
+        elif total_bytes is not None:
+            progress.total_bytes = total_bytes
+        progress.bytes += bytes
+        progress.frames += frames
+        progress.atoms += atoms
+        progress.elapsed = time.perf_counter() - progress.start_time
+        last_callback = self._last_callback.get(task, -self.interval)
+        if self.callback is not None and (bytes or frames) and progress.elapsed - last_callback >= self.interval:
+            self._last_callback[task] = progress.elapsed
+            self.callback(progress)
+
+    def get_report(self):
+        """This method returns the timing report as a dictionary (e.g. to be saved as JSON)."""
+        wall_time = self.wall_time if self._start_time is None or self not in _profilers \
+            else self.wall_time + time.perf_counter() - self._start_time
+        return {
+            "wall_seconds": wall_time,
+            "stages": OrderedDict((name, {"seconds": seconds, "calls": calls})
+                                  for name, (seconds, calls) in self.timers.items()),
+            "tasks": OrderedDict((task, {"bytes": progress.bytes, "frames": progress.frames,
+                                         "atoms": progress.atoms, "seconds": progress.elapsed})
+                                 for task, progress in self.tasks.items()),
+        }
+
+    def format_report(self):
+        """This method returns the timing report as a table."""
+        report = self.get_report()
+        wall_time = max(report["wall_seconds"], 1e-12)
+        lines = ["%-28s %10s %8s %10s" % ("stage", "seconds", "%", "calls")]
+        for name, timer in report["stages"].items():
+            lines.append("%-28s %10.4f %8.1f %10d" % (name, timer["seconds"], 100.0*timer["seconds"]/wall_time,
+                                                      timer["calls"]))
+        lines.append("%-28s %10.4f" % ("total (wall)", wall_time))
+        for progress in self.tasks.values():
+            lines.append(repr(progress))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.format_report()
+
+
+def profile(callback=None, interval=1.0):
+    """This function returns a profiler which collects a timing report of everything within its context,
+    e.g. a whole RunnerAdaptor session (see Profiler)."""
+    return Profiler(callback, interval)
+
+
+def is_profiling():
+    """This function returns whether a profiler is active (e.g. to skip computing progress information)."""
+    return bool(_profilers)
+
+
+class _NullStage:
+    """A context manager which does nothing (used while no profiler is active)."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """A context manager which adds the elapsed time to a stage timer of the active profilers."""
+
+    __slots__ = ("name", "profilers", "start_time")
+
+    def __init__(self, name, profilers):
+        self.name = name
+        self.profilers = profilers
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self.start_time
+        for profiler in self.profilers:
+            profiler.add_time(self.name, seconds)
+        return False
+
+
+def stage(name):
+    """This function returns a context manager which times a stage (nothing is done without active profiler)."""
+    if not _profilers:
+        return _NULL_STAGE
+    return _Stage(name, list(_profilers))
+
+
+def report_progress(task, bytes=0, frames=0, atoms=0, total_bytes=None):
+    """This function adds progress of a task to the active profilers (nothing is done without active profiler)."""
+    for profiler in _profilers:
+        profiler.add_progress(task, bytes, frames, atoms, total_bytes)
+
+
+def timed(function):
+    """This decorator times calls of a function as a stage of its name (e.g. read_runner) while a profiler is
+    active. It must not be used for generator functions."""
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _profilers:
+            return function(*args, **kwargs)
+        with stage(name):
+            return function(*args, **kwargs)
+    return wrapper
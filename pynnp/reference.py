@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Fitting of per-element reference energies
+# ----------------------------------------------------------------------------
+def solve_atomic_energies(composition, energies, ridge=0.0, robust=False, max_iterations=50, tolerance=1e-10):
+    """This function solves composition @ x = energies for per-element reference energies x by linear
+    least squares. A ridge parameter adds ridge*|x|^2 to the objective (e.g. for elements which always appear
+    in fixed ratios). With robust the Huber loss is minimized by iteratively reweighted least squares,
+    so that a few outliers (e.g. unconverged calculations) do not bias the fit."""
+    composition = np.asarray(composition, dtype=float)
+    energies = np.asarray(energies, dtype=float)
+    n_elements = composition.shape[1]
+    weights = np.ones(len(energies))
+    x = np.zeros(n_elements)
+    for _ in range(max_iterations if robust else 1):
+        sqrt_weights = np.sqrt(weights)
+        matrix = composition*sqrt_weights[:, None]
+        vector = energies*sqrt_weights
+        if ridge > 0.0:
+            matrix = np.concatenate([matrix, np.sqrt(ridge)*np.eye(n_elements)])
+            vector = np.concatenate([vector, np.zeros(n_elements)])
+        x_new = np.linalg.lstsq(matrix, vector, rcond=None)[0]
+        converged = np.max(np.abs(x_new - x), initial=0.0) <= tolerance*max(1.0, np.max(np.abs(x_new), initial=0.0))
+        x = x_new
+        if not robust or converged:
+            break
+        # Huber weights with the threshold scaled to the median absolute deviation of residuals
+        residuals = energies - composition @ x
+        scale = 1.4826*np.median(np.abs(residuals - np.median(residuals)))
+        if scale <= 0.0:
+            break
+        threshold = 1.345*scale
+        weights = np.minimum(1.0, threshold/np.maximum(np.abs(residuals), 1e-300))
+    return x
+
+
+class AtomicEnergyFit:
+    """A class that accumulates the normal equations of the per-element reference energy fit
+    (composition^T composition and composition^T energies) over blocks of samples. Memory does not depend
+    on the number of samples, so that the fit can be computed while streaming over files larger than memory.
+
+    Example:
+        fit = AtomicEnergyFit()
+        for sample in iter_runner("input.data"):
+            fit.add_sample(sample)
+        atomic_energy = fit.solve()
+    """
+
+    def __init__(self, ridge=0.0):
+        self.ridge = ridge
+        self.symbols = []
+        self.normal_matrix = np.zeros((0, 0))
+        self.normal_vector = np.zeros(0)
+        self.number_of_samples = 0
+
+    def _add_symbols(self, symbols):
+        """Extend the normal equations for new symbols."""
+        new_symbols = [symbol for symbol in symbols if symbol not in self.symbols]
+        if new_symbols:
+            n = len(self.symbols) + len(new_symbols)
+            normal_matrix = np.zeros((n, n))
+            normal_matrix[:len(self.symbols), :len(self.symbols)] = self.normal_matrix
+            self.normal_matrix = normal_matrix
+            self.normal_vector = np.concatenate([self.normal_vector, np.zeros(len(new_symbols))])
+            self.symbols.extend(new_symbols)
+        return [self.symbols.index(symbol) for symbol in symbols]
+
+    def add(self, composition, energies, symbols):
+        """This method adds a block of samples given by the composition matrix (samples x symbols)
+        and total energies."""
+        columns = self._add_symbols(list(symbols))
+        composition = np.asarray(composition, dtype=float).reshape(-1, len(columns))
+        energies = np.asarray(energies, dtype=float).reshape(-1)
+        self.normal_matrix[np.ix_(columns, columns)] += composition.T @ composition
+        self.normal_vector[columns] += composition.T @ energies
+        self.number_of_samples += len(energies)
+        return self
+
+    def add_dataset(self, dataset):
+        """This method adds all samples of a data set."""
+        return self.add(dataset.get_composition_matrix(), dataset.total_energies, dataset.symbols)
+
+    def add_sample(self, sample):
+        """This method adds a single sample (e.g. from a streaming reader)."""
+        atom_types_numbers = sample.get_atom_types_and_numbers()
+        return self.add([list(atom_types_numbers.values())], [sample.collective.total_energy],
+                        atom_types_numbers.keys())
+
+    def solve(self):
+        """This method returns a dictionary of fitted reference energies for each element."""
+        n = len(self.symbols)
+        x = np.linalg.lstsq(self.normal_matrix + self.ridge*np.eye(n), self.normal_vector, rcond=None)[0]
+        return OrderedDict(zip(self.symbols, x.tolist()))
+
+
+def fit_atomic_energies(dataset, ridge=0.0, robust=False):
+    """This function fits reference energies of each element to the total energies of a data set
+    (see solve_atomic_energies) and returns them as a dictionary."""
+    composition = dataset.get_composition_matrix()
+    # elements which do not appear in any sample (e.g. after selection) are not fitted
+    codes = np.flatnonzero(np.any(composition > 0, axis=0))
+    x = solve_atomic_energies(composition[:, codes], dataset.total_energies, ridge, robust)
+    return OrderedDict((dataset.symbols[code], value) for code, value in zip(codes.tolist(), x.tolist()))
@@ -0,0 +1,317 @@
+from .neighbor import NeighborList, get_cell_matrix, is_periodic
+from .utils import get_number_of_processes, map_dataset_chunks
+from .validation import reduce_samples
+from collections import OrderedDict
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Per-sample fingerprints
+# ----------------------------------------------------------------------------
+def get_pair_codes(number_of_symbols):
+    """This function returns a symmetric matrix which maps pairs of element codes to pair indices."""
+    pair_codes = np.zeros((number_of_symbols, number_of_symbols), dtype=np.int64)
+    rows, columns = np.triu_indices(number_of_symbols)
+    pair_codes[rows, columns] = np.arange(len(rows))
+    pair_codes[columns, rows] = np.arange(len(rows))
+    return pair_codes
+
+
+def compute_radial_histograms(dataset, cutoff=6.0, number_of_bins=16):
+    """This function returns the histograms of pair distances within the cutoff radius for each element pair
+    (number of samples x element pairs*number of bins), normalized to the number of atoms of each sample."""
+    number_of_symbols = len(dataset.symbols)
+    pair_codes = get_pair_codes(number_of_symbols)
+    number_of_features = (number_of_symbols*(number_of_symbols+1)//2)*number_of_bins
+    histograms = np.zeros((dataset.number_of_samples, number_of_features))
+    elements, offsets, cells = dataset.elements, dataset.offsets, dataset.cells
+    positions = dataset.positions
+    for index in range(dataset.number_of_samples):
+        start, stop = offsets[index], offsets[index+1]
+        if stop - start < 1:
+            continue
+        neighbors = NeighborList(positions[start:stop], cells[index], cutoff, half=True)
+        codes = elements[start:stop]
+        bins = np.minimum((neighbors.distances*(number_of_bins/cutoff)).astype(np.int64), number_of_bins-1)
+        keys = pair_codes[codes[neighbors.i], codes[neighbors.j]]*number_of_bins + bins
+        histograms[index] = np.bincount(keys, minlength=number_of_features)/(stop - start)
+    return histograms
+
+
+def compute_radial_histogram_range(arguments):
+    """This function computes the radial histograms of a chunk of samples (dataset, cutoff, number_of_bins)
+    in a worker process of compute_fingerprints, which concatenates the rows of all chunks."""
+    dataset, cutoff, number_of_bins = arguments
+    return compute_radial_histograms(dataset, cutoff, number_of_bins)
+
+
+def compute_fingerprints(dataset, cutoff=6.0, number_of_bins=16, processes=1, chunk_size=1000):
+    """This function returns cheap fingerprints of the samples (number of samples x features), which are the
+    fractions of each element followed by the radial histograms of each element pair (see
+    compute_radial_histograms). With more than one process (None means all cores) the histograms of chunks
+    of samples are computed in a pool of processes."""
+    composition = dataset.get_composition_matrix()
+    number_of_atoms = np.maximum(dataset.get_number_of_atoms_per_sample(), 1)
+    processes = get_number_of_processes(processes)
+    if processes > 1:
+        # chunks keep the symbol table of the whole data set, so that all histograms have the same columns
+        histograms = list(map_dataset_chunks(compute_radial_histogram_range, dataset, chunk_size, processes, cutoff,
+                                             number_of_bins))
+        histograms = np.concatenate(histograms) if histograms else np.zeros((0, 0))
+    else:
+        histograms = compute_radial_histograms(dataset, cutoff, number_of_bins)
+    return np.concatenate([composition/number_of_atoms[:, None], histograms], axis=1)
+
+
+# ----------------------------------------------------------------------------
+# Selection of diverse samples
+# ----------------------------------------------------------------------------
+def _farthest_point_sampling(features, number_of_samples, first):
+    """Greedy farthest-point (k-center) selection starting from the given index."""
+    norms = np.einsum("ij,ij->i", features, features)
+    min_distances = np.full(len(features), np.inf)
+    selection = np.empty(number_of_samples, dtype=np.int64)
+    index = first
+    for k in range(number_of_samples):
+        selection[k] = index
+        distances = norms - 2.0*(features @ features[index]) + norms[index]
+        np.minimum(min_distances, distances, out=min_distances)
+        min_distances[index] = -np.inf
+        index = int(np.argmax(min_distances))
+    return selection
+
+
+def farthest_point_sampling(features, number_of_samples, seed=1234, chunk_size=50000, oversampling=2.0):
+    """This function selects a diverse subset of rows of the features by greedy farthest-point (k-center)
+    sampling and returns their indices in the order of selection. Large inputs are shuffled and split into
+    chunks of the given size: each chunk contributes oversampling times its share of candidates,
+    and the final selection is made among the candidates, so cost is linear in the number of rows."""
+    features = np.asarray(features, dtype=float)
+    n_rows = len(features)
+    number_of_samples = int(number_of_samples)
+    assert 0 <= number_of_samples <= n_rows, "Unexpected number of samples"
+    if number_of_samples == 0:
+        return np.zeros(0, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    candidates = np.arange(n_rows, dtype=np.int64)
+    if n_rows > chunk_size:
+        candidates = rng.permutation(n_rows)
+        selected = []
+        for start in range(0, n_rows, chunk_size):
+            chunk = candidates[start:start+chunk_size]
+            k = min(len(chunk), int(np.ceil(oversampling*number_of_samples*len(chunk)/n_rows)))
+            selected.append(chunk[_farthest_point_sampling(features[chunk], k, int(rng.integers(len(chunk))))])
+        candidates = np.concatenate(selected)
+    first = int(rng.integers(len(candidates)))
+    return candidates[_farthest_point_sampling(features[candidates], number_of_samples, first)]
+
+
+def select_diverse_samples(dataset, number_of_samples, cutoff=6.0, number_of_bins=16, seed=1234, processes=1,
+                           dimension=32):
+    """This function returns indices of a diverse subset of samples of a data set. Fingerprints
+    (see compute_fingerprints) are standardized and, if they have more features than the given dimension,
+    sketched by a seeded Gaussian random projection before farthest-point sampling."""
+    features = compute_fingerprints(dataset, cutoff, number_of_bins, processes)
+    std = np.std(features, axis=0)
+    features = (features - np.mean(features, axis=0))/np.where(std > 0.0, std, 1.0)
+    if features.shape[1] > dimension:
+        rng = np.random.default_rng(seed)
+        features = features @ rng.normal(size=(features.shape[1], dimension))/np.sqrt(dimension)
+    return farthest_point_sampling(features, number_of_samples, seed)
+
+
+# ----------------------------------------------------------------------------
+# Detection of duplicate samples
+# ----------------------------------------------------------------------------
+def match_structures(positions_a, elements_a, positions_b, elements_b, cell, tolerance=1e-2):
+    """This function checks whether two structures with the same cell are identical up to a permutation
+    of atoms of the same element and a translation (under periodic boundary conditions). Each atom must
+    have a distinct counterpart of the same element within the tolerance."""
+    if len(elements_a) != len(elements_b):
+        return False
+    if len(elements_a) == 0:
+        return True
+    codes, counts = np.unique(elements_a, return_counts=True)
+    codes_b, counts_b = np.unique(elements_b, return_counts=True)
+    if not (np.array_equal(codes, codes_b) and np.array_equal(counts, counts_b)):
+        return False
+    periodic = is_periodic(cell)
+    matrix = get_cell_matrix(cell)
+    inverse = np.linalg.inv(matrix) if periodic else None
+    groups = [(positions_a[elements_a == code], positions_b[elements_b == code]) for code in codes]
+    # translations which map an atom of the rarest element of A onto the atoms of the same element of B
+    rarest_a, rarest_b = groups[int(np.argmin(counts))]
+    for translation in rarest_b - rarest_a[0]:
+        for group_a, group_b in groups:
+            differences = (group_a + translation)[:, None, :] - group_b[None, :, :]
+            if periodic:
+                fractional = differences @ inverse
+                differences = (fractional - np.round(fractional)) @ matrix
+            distances2 = np.einsum("ijk,ijk->ij", differences, differences)
+            nearest = np.argmin(distances2, axis=1)
+            if np.max(distances2[np.arange(len(nearest)), nearest]) > tolerance*tolerance \
+                    or len(np.unique(nearest)) != len(nearest):
+                break
+        else:
+            return True
+    return False
+
+
+def get_candidate_pairs(groups, keys, tolerance):
+    """This function returns pairs of indices of items in the same group whose keys differ by no more than
+    the tolerance. Items are sorted by group and key, so that candidates are found in a sliding window."""
+    order = np.lexsort((keys, groups))
+    groups, keys = groups[order], keys[order]
+    list_i, list_j = [], []
+    distance = 1
+    while distance < len(order):
+        close = (groups[distance:] == groups[:-distance]) & (keys[distance:] - keys[:-distance] <= tolerance)
+        if not np.any(close):
+            break
+        list_i.append(order[:-distance][close])
+        list_j.append(order[distance:][close])
+        distance += 1
+    if not list_i:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(list_i), np.concatenate(list_j)
+
+
+# low-order reciprocal lattice vectors (in units of the reciprocal cell) of geometry keys
+GEOMETRY_KEY_VECTORS = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0], [1, 0, 1], [0, 1, 1], [1, 1, 1]])
+
+
+def compute_geometry_keys(dataset, tolerance=1e-2):
+    """This function returns a scalar key for each sample which is invariant under permutations of atoms,
+    translations and periodic images, and the largest change of the key if atoms are displaced by no more than
+    the tolerance. The key is the mean magnitude of the structure factor per atom at low-order reciprocal lattice
+    vectors (or the radius of gyration for non-periodic samples)."""
+    offsets = dataset.offsets
+    number_of_atoms = np.maximum(np.diff(offsets), 1)
+    cells = dataset.cells.reshape(-1, 3, 3)
+    periodic = np.abs(np.linalg.det(cells)) > 1e-12
+    inverses = np.zeros_like(cells)
+    inverses[periodic] = np.linalg.inv(cells[periodic])
+    samples = np.repeat(np.arange(len(cells)), np.diff(offsets))
+    positions = dataset.positions
+    fractional = np.einsum("ij,ijk->ik", positions, inverses[samples])
+    phases = 2.0*np.pi*(fractional @ GEOMETRY_KEY_VECTORS.T)
+    real = reduce_samples(np.add, np.cos(phases), offsets, empty=0.0)
+    imaginary = reduce_samples(np.add, np.sin(phases), offsets, empty=0.0)
+    keys = np.mean(np.sqrt(real**2 + imaginary**2), axis=1)/number_of_atoms
+    # |d|S|/N| <= 2 pi |k| tolerance for displacements within the tolerance
+    wave_vectors = np.linalg.norm(np.einsum("sij,kj->ski", inverses, GEOMETRY_KEY_VECTORS), axis=2)
+    key_tolerance = 2.0*np.pi*tolerance*np.max(wave_vectors, initial=0.0)
+    if not np.all(periodic):
+        center = reduce_samples(np.add, positions, offsets, empty=0.0)/number_of_atoms[:, None]
+        squares = reduce_samples(np.add, np.sum((positions - center[samples])**2, axis=1), offsets, empty=0.0)
+        keys[~periodic] = np.sqrt(squares/number_of_atoms)[~periodic]
+        key_tolerance = max(key_tolerance, tolerance)
+    return keys, key_tolerance
+
+
+def find_duplicate_samples(dataset, tolerance=1e-2, energy_tolerance=1e-3):
+    """This function returns groups (sorted lists of sample indices) of duplicate or near-duplicate samples.
+    Samples are bucketed by composition and compared only to samples with close geometry keys
+    (see compute_geometry_keys), equal cells within the tolerance and close energies per atom (unless
+    energy_tolerance is None), before the atoms are matched exactly (see match_structures).
+    Cost is near-linear in the number of samples."""
+    n_samples = dataset.number_of_samples
+    if n_samples < 2:
+        return []
+    groups = np.unique(dataset.get_composition_matrix(), axis=0, return_inverse=True)[1].reshape(-1)
+    keys, key_tolerance = compute_geometry_keys(dataset, tolerance)
+    candidates_i, candidates_j = get_candidate_pairs(groups, keys, key_tolerance)
+    cells = dataset.cells
+    keep = np.max(np.abs(cells[candidates_i] - cells[candidates_j]), axis=1, initial=0.0) <= tolerance
+    if energy_tolerance is not None:
+        energies = dataset.total_energies/np.maximum(dataset.get_number_of_atoms_per_sample(), 1)
+        keep &= np.abs(energies[candidates_i] - energies[candidates_j]) <= energy_tolerance
+    candidates_i, candidates_j = candidates_i[keep], candidates_j[keep]
+    # union-find over verified pairs (pairs already in the same group are not verified again)
+    parents = np.arange(n_samples)
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    offsets, positions, elements = dataset.offsets, dataset.positions, dataset.elements
+    for i, j in zip(candidates_i.tolist(), candidates_j.tolist()):
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            continue
+        slice_i, slice_j = slice(offsets[i], offsets[i+1]), slice(offsets[j], offsets[j+1])
+        if match_structures(positions[slice_i], elements[slice_i], positions[slice_j], elements[slice_j],
+                            cells[i], tolerance):
+            parents[max(root_i, root_j)] = min(root_i, root_j)
+    roots = np.array([find(index) for index in range(n_samples)])
+    result = {}
+    for index in np.flatnonzero(roots != np.arange(n_samples)).tolist():
+        result.setdefault(int(roots[index]), [int(roots[index])]).append(index)
+    return [result[root] for root in sorted(result)]
+
+
+# ----------------------------------------------------------------------------
+# Splits and shards of data sets
+# ----------------------------------------------------------------------------
+def get_split_counts(number_of_samples, ratios):
+    """This function returns the number of samples of each split for the given ratios (normalized to one).
+    Counts are rounded by largest remainder, so that they add up to the number of samples."""
+    ratios = np.asarray(ratios, dtype=np.float64)
+    assert len(ratios) and np.all(ratios >= 0.0) and np.sum(ratios) > 0.0, "Expected non-negative ratios"
+    exact = number_of_samples*ratios/np.sum(ratios)
+    counts = np.floor(exact).astype(np.int64)
+    remainder = number_of_samples - int(np.sum(counts))
+    counts[np.argsort(counts - exact, kind="stable")[:remainder]] += 1
+    return counts
+
+
+def get_split_ratios(splits):
+    """This function returns names and ratios of splits given as a number of equal shards (named shard_000, ...),
+    a list of ratios (named split_0, ...) or a dictionary of names and ratios (e.g. {"train": 0.8, "test": 0.2})."""
+    if isinstance(splits, (int, np.integer)):
+        assert splits >= 1, "Expected at least one shard"
+        width = max(3, len(str(int(splits) - 1)))
+        return ["shard_%0*d" % (width, index) for index in range(int(splits))], [1.0]*int(splits)
+    if isinstance(splits, dict):
+        return [str(name) for name in splits], [float(ratio) for ratio in splits.values()]
+    return ["split_%d" % index for index in range(len(splits))], [float(ratio) for ratio in splits]
+
+
+def split_samples(dataset, splits, seed=1234, stratify=False):
+    """This function assigns each sample of a data set to one of the splits (see get_split_ratios) and returns
+    a dictionary of names and sorted sample indices. Samples are shuffled with the seed before they are divided
+    by ratio (None keeps consecutive blocks in the order of the data set). With stratify the ratios hold for each
+    composition (number of atoms of each element) separately, or for each label of a given array of labels."""
+    names, ratios = get_split_ratios(splits)
+    number_of_samples = dataset.number_of_samples
+    if stratify is None or stratify is False:
+        groups = [np.arange(number_of_samples)]
+    else:
+        labels = dataset.get_composition_matrix() if stratify is True else np.asarray(stratify)
+        assert len(labels) == number_of_samples, "Expected a label for each sample"
+        inverse = np.unique(labels, axis=0, return_inverse=True)[1].reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        groups = np.split(order, np.cumsum(np.bincount(inverse))[:-1]) if number_of_samples else []
+    rng = None if seed is None else np.random.default_rng(seed)
+    counts = get_split_counts(number_of_samples, ratios)
+    weights = np.asarray(ratios)/np.sum(ratios)
+    parts, leftovers = [[np.zeros(0, dtype=np.int64)] for _ in names], [np.zeros(0, dtype=np.int64)]
+    for group in groups:
+        if rng is not None:
+            group = rng.permutation(group)
+        # each group gets its rounded-down share, the remaining samples of all groups fill up the splits
+        group_counts = counts.copy() if len(groups) == 1 else np.floor(len(group)*weights + 1e-9).astype(np.int64)
+        bounds = np.concatenate([[0], np.cumsum(group_counts)])
+        for part, start, stop in zip(parts, bounds[:-1], bounds[1:]):
+            part.append(group[start:stop])
+        leftovers.append(group[bounds[-1]:])
+        counts -= group_counts
+    leftovers = np.concatenate(leftovers)
+    if rng is not None:
+        leftovers = rng.permutation(leftovers)
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    for part, start, stop in zip(parts, bounds[:-1], bounds[1:]):
+        part.append(leftovers[start:stop])
+    return OrderedDict((name, np.sort(np.concatenate(part))) for name, part in zip(names, parts))
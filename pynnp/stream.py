@@ -0,0 +1,82 @@
+from .compression import open_file
+from .dataset import DataSet
+from .reference import AtomicEnergyFit
+from .runner import write_runner_samples, write_xyz_samples
+from .unit import UnitConversion
+
+
+# ----------------------------------------------------------------------------
+# Setup class for SamplePipeline
+# ----------------------------------------------------------------------------
+class SamplePipeline:
+    """A class that chains per-sample stages between a streaming source of samples (e.g. iter_runner
+    or iter_lammps) and a streaming sink (e.g. write_runner), so that read-modify-write jobs run in
+    constant memory. A stage is a function that takes a sample and returns it (possibly modified)
+    or None to drop the sample.
+
+    Example:
+        SamplePipeline(iter_runner("input.data")).drop_close_contacts(1.0)\\
+            .remove_atomic_energy({"Si": -0.5}).write_runner("input.data.new")
+    """
+
+    def __init__(self, source):
+        self.source = source  # iterable of samples
+        self.stages = []
+
+    def map(self, function):
+        """This method adds a stage which modifies samples (returning None drops the sample)."""
+        self.stages.append(function)
+        return self
+
+    def filter(self, predicate):
+        """This method adds a stage which keeps only samples for which the predicate is true."""
+        return self.map(lambda sample: sample if predicate(sample) else None)
+
+    def drop_close_contacts(self, min_distance):
+        """This method adds a stage which drops samples with any atomic distance below the given value."""
+        return self.filter(lambda sample: sample.get_min_distance() >= min_distance)
+
+    def remove_atomic_energy(self, atomic_energy):
+        """This method adds a stage which subtracts atomic energy from the total energy."""
+        assert isinstance(atomic_energy, dict), "Expected type of dict for input argument energies"
+        return self.map(lambda sample: sample.remove_atomic_energy(atomic_energy))
+
+    def convert_units(self, uc):
+        """This method adds a stage which applies a unit conversion to the samples."""
+        return self.map(lambda sample: sample.convert_units(uc))
+
+    def __iter__(self):
+        for sample in self.source:
+            for stage in self.stages:
+                sample = stage(sample)
+                if sample is None:
+                    break
+            else:
+                yield sample
+
+    def write_runner(self, filename, uc=UnitConversion(), compression_level=None):
+        """This method writes the resulting samples in RuNNer structure file format (compressed according to
+        the suffix of the file name, see open_file) and returns the number of written samples."""
+        with open_file(filename, "w", compression_level) as out_file:
+            return write_runner_samples(out_file, self, uc)
+
+    def write_xyz(self, filename, uc=UnitConversion(), compression_level=None):
+        """This method writes the resulting samples in .xyz structure file format (compressed according to
+        the suffix of the file name, see open_file) and returns the number of written samples."""
+        with open_file(filename, "w", compression_level) as out_file:
+            return write_xyz_samples(out_file, self, uc)
+
+    def fit_atomic_energy(self, ridge=0.0):
+        """This method fits reference energies of each element to the resulting samples by linear least
+        squares in constant memory (see AtomicEnergyFit) and returns them as a dictionary."""
+        fit = AtomicEnergyFit(ridge)
+        for sample in self:
+            fit.add_sample(sample)
+        return fit.solve()
+
+    def collect(self):
+        """This method collects the resulting samples into a data set."""
+        dataset = DataSet()
+        for sample in self:
+            dataset.append(sample)
+        return dataset
@@ -1,5 +1,99 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from .profiling import stage
+import hashlib
+import os
+import numpy as np
 
 
 def get_time_and_date():
     return datetime.now().strftime("%H:%M:%S %d/%m/%Y")
+
+
+WRITE_BUFFER_SIZE = 1 << 22  # number of characters which are collected before writing into a file
+
+
+def write_buffered(out_file, texts, buffer_size=WRITE_BUFFER_SIZE):
+    """This function writes an iterable of strings (e.g. formatted frames) into a file in large buffers
+    and returns the number of strings."""
+    buffer, size, count = [], 0, 0
+    for text in texts:
+        buffer.append(text)
+        size += len(text)
+        count += 1
+        if size >= buffer_size:
+            with stage("write"):
+                out_file.write("".join(buffer))
+            buffer, size = [], 0
+    with stage("write"):
+        out_file.write("".join(buffer))
+    return count
+
+
+def get_file_checksum(filename, block_size=1 << 20):
+    """This function returns the SHA-256 checksum (hex digest) of the bytes of a file."""
+    checksum = hashlib.sha256()
+    with open(str(filename), "rb") as in_file:
+        for block in iter(lambda: in_file.read(block_size), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def get_number_of_processes(processes=None):
+    """This function returns the number of worker processes (None means all available cores)."""
+    if processes is None:
+        return os.cpu_count() or 1
+    return max(1, int(processes))
+
+
+def iter_dataset_chunks(dataset, chunk_size):
+    """This function yields consecutive chunks of at most chunk_size samples of a data set as new data sets
+    (e.g. as arguments of parallel_map). Chunks keep the symbol table of the data set."""
+    n_samples = dataset.number_of_samples
+    for start in range(0, n_samples, chunk_size):
+        yield dataset.take(np.arange(start, min(start+chunk_size, n_samples)))
+
+
+def iter_parallel_map(function, list_of_arguments, processes=None, chunksize=1, max_pending=None):
+    """This function applies a (picklable) function to each argument in a pool of processes
+    and yields the results in the original order as soon as they are available.
+    It runs serially for a single process. With max_pending the arguments are taken lazily
+    (e.g. from a generator) and at most max_pending tasks are submitted ahead of the consumer,
+    so that memory of arguments and results waiting for the consumer is bounded."""
+    processes = get_number_of_processes(processes)
+    if max_pending is None:
+        list_of_arguments = list(list_of_arguments)
+        processes = min(processes, max(1, len(list_of_arguments)))
+    if processes == 1:
+        for arguments in list_of_arguments:
+            yield function(arguments)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        if max_pending is None:
+            for result in executor.map(function, list_of_arguments, chunksize=chunksize):
+                yield result
+            return
+        pending = deque()
+        for arguments in list_of_arguments:
+            pending.append(executor.submit(function, arguments))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def map_dataset_chunks(function, dataset, chunk_size, processes=None, *args):
+    """This function applies a (picklable) function to (chunk, *args) for consecutive chunks of samples of a data
+    set (see iter_dataset_chunks) in a pool of processes and yields the results in the original order.
+    Chunks are copied lazily, at most two per process ahead of the consumer (see iter_parallel_map),
+    so that memory does not grow with the size of the data set."""
+    processes = get_number_of_processes(processes)
+    arguments = ((chunk,) + args for chunk in iter_dataset_chunks(dataset, chunk_size))
+    return iter_parallel_map(function, arguments, processes, max_pending=2*processes)
+
+
+def parallel_map(function, list_of_arguments, processes=None, chunksize=1):
+    """This function applies a (picklable) function to each argument in a pool of processes
+    and returns the results in the original order. It runs serially for a single process."""
+    return list(iter_parallel_map(function, list_of_arguments, processes, chunksize))
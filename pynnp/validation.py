@@ -0,0 +1,221 @@
+from collections import OrderedDict
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Segmented reductions over samples
+# ----------------------------------------------------------------------------
+def reduce_samples(ufunc, values, offsets, empty=np.nan):
+    """This function reduces atomic values (first axis) over the atoms of each sample
+    given by offsets (e.g. np.add or np.maximum). Samples without atoms get the empty value."""
+    counts = np.diff(offsets)
+    result = np.full((len(counts),) + values.shape[1:], empty, dtype=float)
+    nonempty = counts > 0
+    if np.any(nonempty):
+        result[nonempty] = ufunc.reduceat(values, offsets[:-1][nonempty], axis=0)
+    return result
+
+
+def get_top_indices(values, k):
+    """This function returns indices of the k largest values (in descending order)."""
+    values = np.asarray(values)
+    k = min(int(k), len(values))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-values, k-1)[:k]
+    return top[np.argsort(-values[top], kind="stable")]
+
+
+# ----------------------------------------------------------------------------
+# Setup class for ErrorAnalysis
+# ----------------------------------------------------------------------------
+class ErrorAnalysis:
+    """A class that computes energy and force errors between a reference and a predicted data set
+    (or RunnerAdaptor objects) in batch. Forces of both data sets are flattened once and all errors are
+    computed by segmented reductions over samples."""
+
+    METHODS = ("max", "rmse", "mae")
+
+    def __init__(self, reference, prediction, components=(0, 1, 2)):
+        self.reference = getattr(reference, "dataset", reference)
+        self.prediction = getattr(prediction, "dataset", prediction)
+        assert self.reference.number_of_samples == self.prediction.number_of_samples, "Unequal number of samples"
+        number_of_atoms = self.reference.get_number_of_atoms_per_sample()
+        assert np.array_equal(number_of_atoms, self.prediction.get_number_of_atoms_per_sample()), \
+            "Unequal number of atoms"
+        self.components = [components] if isinstance(components, int) else list(components)
+        self.number_of_atoms = number_of_atoms
+        self.offsets = self.reference.offsets
+        # energy errors per atom and force differences (number of atoms x number of components)
+        self.energy_errors = np.abs(self.reference.total_energies/number_of_atoms
+                                    - self.prediction.total_energies/number_of_atoms)
+        self.force_differences = self.reference.forces[:, self.components] \
+            - self.prediction.forces[:, self.components]
+
+    def _get_atomic_errors(self, method):
+        """Return per-atom error values which are reduced over samples, elements or components."""
+        method = method.lower()
+        if method == "max":
+            return np.abs(self.force_differences)
+        elif method == "rmse":
+            return self.force_differences**2
+        elif method == "mae":
+            return np.abs(self.force_differences)
+        raise AssertionError("Unknown input method for force-error calculation")
+
+    @staticmethod
+    def _finalize(method, values, counts):
+        """Convert reduced atomic errors into the requested error measure."""
+        method = method.lower()
+        if method == "max":
+            return values
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = values/counts
+        return np.sqrt(values) if method == "rmse" else values
+
+    def get_force_errors(self, method="max"):
+        """This method returns a list of force errors (max, rmse or mae of the components) for samples."""
+        errors = self._get_atomic_errors(method)
+        if method.lower() == "max":
+            return reduce_samples(np.maximum, np.max(errors, axis=1, initial=0.0), self.offsets)
+        values = reduce_samples(np.add, np.sum(errors, axis=1), self.offsets)
+        return self._finalize(method, values, self.number_of_atoms*len(self.components))
+
+    def get_force_errors_per_element(self, method="rmse"):
+        """This method returns a dictionary of force errors over all atoms of each element."""
+        errors = self._get_atomic_errors(method)
+        elements = self.reference.elements
+        result = OrderedDict()
+        for code in np.unique(elements):
+            selected = errors[elements == code]
+            value = np.max(selected) if method.lower() == "max" else np.sum(selected)
+            result[self.reference.symbols[code]] = float(self._finalize(method, value, selected.size))
+        return result
+
+    def get_force_errors_per_component(self, method="rmse"):
+        """This method returns an array of force errors over all atoms for each force component."""
+        errors = self._get_atomic_errors(method)
+        if method.lower() == "max":
+            return np.max(errors, axis=0, initial=0.0)
+        return self._finalize(method, np.sum(errors, axis=0), len(errors))
+
+    def get_worst_samples(self, k=10, quantity="force", method="max"):
+        """This method returns indices of the k samples with the largest energy or force errors."""
+        if quantity.lower() == "energy":
+            errors = self.energy_errors
+        elif quantity.lower() == "force":
+            errors = self.get_force_errors(method)
+        else:
+            raise AssertionError("Unknown quantity (expected energy or force)")
+        return get_top_indices(np.nan_to_num(errors, nan=-np.inf), k)
+
+    def find(self, energy_error_threshold=None, force_error_threshold=None, method="max"):
+        """This method returns a sorted array of sample indices with energy/force error beyond
+        the specified thresholds."""
+        mask = np.zeros(len(self.energy_errors), dtype=bool)
+        if energy_error_threshold is not None:
+            mask |= self.energy_errors >= energy_error_threshold
+        if force_error_threshold is not None:
+            mask |= self.get_force_errors(method) >= force_error_threshold
+        return np.flatnonzero(mask)
+
+
+# ----------------------------------------------------------------------------
+# Setup class for CommitteeAnalysis
+# ----------------------------------------------------------------------------
+class CommitteeAnalysis:
+    """A class that computes the disagreement (standard deviation) of energies and forces predicted by a committee
+    of K models (data sets or RunnerAdaptor objects of the same samples), e.g. for active learning.
+    Means and variances are accumulated over the committee members one at a time (Welford's algorithm),
+    so that additional memory does not depend on K. An optional reference data set gives the errors of
+    the committee mean."""
+
+    METHODS = ("max", "mean")
+
+    def __init__(self, predictions, reference=None, components=(0, 1, 2)):
+        predictions = [getattr(prediction, "dataset", prediction) for prediction in predictions]
+        assert len(predictions) >= 2, "Expected at least two committee members"
+        number_of_atoms = predictions[0].get_number_of_atoms_per_sample()
+        self.components = [components] if isinstance(components, int) else list(components)
+        self.number_of_atoms = number_of_atoms
+        self.offsets = predictions[0].offsets
+        self.size = len(predictions)
+        for k, prediction in enumerate(predictions, start=1):
+            assert np.array_equal(number_of_atoms, prediction.get_number_of_atoms_per_sample()), \
+                "Unequal number of atoms"
+            values = (prediction.total_energies/number_of_atoms, prediction.atomic_energies,
+                      prediction.forces[:, self.components])
+            if k == 1:
+                means = [np.array(value, dtype=float) for value in values]
+                squares = [np.zeros_like(mean) for mean in means]
+                continue
+            for mean, square, value in zip(means, squares, values):
+                delta = value - mean
+                mean += delta/k
+                square += delta*(value - mean)
+        # mean predictions and standard deviations over the committee
+        self.energy_mean, self.atomic_energy_mean, self.force_mean = means
+        self.energy_std = np.sqrt(squares[0]/self.size)  # energy per atom
+        self.atomic_energy_std = np.sqrt(squares[1]/self.size)
+        # deviation of force vectors sqrt(<|F - <F>|^2>) of each atom
+        self.atomic_force_std = np.sqrt(np.sum(squares[2], axis=1)/self.size)
+        self.reference = None if reference is None else getattr(reference, "dataset", reference)
+        if self.reference is not None:
+            assert np.array_equal(number_of_atoms, self.reference.get_number_of_atoms_per_sample()), \
+                "Unequal number of atoms"
+
+    def get_force_std(self, method="max"):
+        """This method returns the deviation of atomic forces (max or mean over atoms) for samples."""
+        method = method.lower()
+        if method == "max":
+            return reduce_samples(np.maximum, self.atomic_force_std, self.offsets)
+        elif method == "mean":
+            return reduce_samples(np.add, self.atomic_force_std, self.offsets)/self.number_of_atoms
+        raise AssertionError("Unknown input method for force deviation (expected max or mean)")
+
+    def get_disagreement(self, quantity="force", method="max"):
+        """This method returns the energy (per atom) or force deviation of samples."""
+        if quantity.lower() == "energy":
+            return self.energy_std
+        elif quantity.lower() == "force":
+            return self.get_force_std(method)
+        raise AssertionError("Unknown quantity (expected energy or force)")
+
+    def get_candidates(self, k=100, quantity="force", method="max", max_std=None):
+        """This method returns indices of the k samples with the largest disagreement. Samples with
+        disagreement beyond max_std (e.g. unphysical structures) are excluded."""
+        disagreement = np.nan_to_num(self.get_disagreement(quantity, method), nan=-np.inf)
+        if max_std is not None:
+            disagreement = np.where(disagreement > max_std, -np.inf, disagreement)
+        top = get_top_indices(disagreement, k)
+        return top[np.isfinite(disagreement[top])]
+
+    def find(self, energy_std_threshold=None, force_std_threshold=None, method="max"):
+        """This method returns a sorted array of sample indices with energy/force deviation beyond
+        the specified thresholds."""
+        mask = np.zeros(len(self.energy_std), dtype=bool)
+        if energy_std_threshold is not None:
+            mask |= self.energy_std >= energy_std_threshold
+        if force_std_threshold is not None:
+            mask |= self.get_force_std(method) >= force_std_threshold
+        return np.flatnonzero(mask)
+
+    def get_energy_errors(self):
+        """This method returns the absolute errors of the mean energy (per atom) with respect to the reference."""
+        assert self.reference is not None, "No reference data set was given"
+        return np.abs(self.reference.total_energies/self.number_of_atoms - self.energy_mean)
+
+    def get_force_errors(self, method="rmse"):
+        """This method returns force errors (max, rmse or mae of the components) of the mean forces with respect
+        to the reference for samples."""
+        assert self.reference is not None, "No reference data set was given"
+        differences = self.reference.forces[:, self.components] - self.force_mean
+        method = method.lower()
+        if method == "max":
+            return reduce_samples(np.maximum, np.max(np.abs(differences), axis=1, initial=0.0), self.offsets)
+        elif method in ("rmse", "mae"):
+            errors = differences**2 if method == "rmse" else np.abs(differences)
+            values = reduce_samples(np.add, np.sum(errors, axis=1), self.offsets) \
+                / (self.number_of_atoms*len(self.components))
+            return np.sqrt(values) if method == "rmse" else values
+        raise AssertionError("Unknown input method for force-error calculation")
@@ -1,6 +1,115 @@
+from .compression import COMPRESSION_SUFFIXES, open_file
 from .runner import RunnerAdaptor
 from .unit import UnitConversion
-from .dataset import SampleData, AtomicData, CollectiveData
+from .dataset import DataSet, SampleData, AtomicData, CollectiveData
+from .utils import get_number_of_processes, iter_parallel_map
+from collections import deque
+from itertools import islice
+import glob
+import os
+import time
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+# Parsing of VASP OUTCAR file format
+# ----------------------------------------------------------------------------
+def parse_outcar_header(in_file, symbol_list=None):
+    """This function reads the header of an OUTCAR file (opened in binary mode) up to the number of ions
+    per type and returns the list of atomic symbols. Symbols are taken from the TITEL lines of the
+    pseudo-potentials unless a list of symbols (one for each type) is given."""
+    titles = []
+    for line in in_file:
+        if b"TITEL" in line:
+            titles.append(line.split()[3].split(b"_")[0].decode())
+        elif b"ions per type" in line:
+            numbers = [int(number) for number in line.split(b"=")[1].split()]
+            break
+    else:
+        raise AssertionError("No number of ions per type found in OUTCAR")
+    if symbol_list is None:
+        symbol_list = titles[:len(numbers)]
+    assert len(symbol_list) == len(numbers), "Unexpected number of atomic symbols (%d types)" % len(numbers)
+    return [symbol for symbol, number in zip(symbol_list, numbers) for _ in range(number)]
+
+
+def parse_outcar_frames(in_file, symbol_list=None, uc=UnitConversion(), start=0, stop=None, stride=1):
+    """This function parses ionic steps of an OUTCAR file (opened in binary mode) and yields a dictionary
+    of arrays for each step (see DataSet.extend_arrays). Positions and forces are read from the
+    POSITION/TOTAL-FORCE block of each step, the cell from the latest direct lattice vectors, and total energy
+    from TOTEN of the following FREE ENERGIE block. Only steps start, start+stride, ... before stop are
+    converted, the blocks of other steps are skipped without tokenizing. Incomplete steps are ignored."""
+    assert start >= 0 and stride >= 1, "Expected non-negative start and positive stride"
+    symbols = parse_outcar_header(in_file, symbol_list)
+    number_of_atoms = len(symbols)
+    atom_ids = np.arange(1, number_of_atoms+1)
+    zeros = np.zeros(number_of_atoms)
+    n_step = -1
+    cell, frame, free_energy = None, None, False
+    for line in in_file:
+        if b"direct lattice vectors" in line:
+            lines = list(islice(in_file, 3))
+            cell = np.array(b" ".join(lines).split(), dtype=float).reshape(3, 6)[:, :3]
+        elif b"POSITION" in line and b"TOTAL-FORCE" in line:
+            n_step += 1
+            if stop is not None and n_step >= stop:
+                break
+            next(in_file)
+            if n_step < start or (n_step - start) % stride != 0:
+                deque(islice(in_file, number_of_atoms), maxlen=0)
+                frame = None
+                continue
+            lines = list(islice(in_file, number_of_atoms))
+            assert len(lines) == number_of_atoms, "Unexpected end of OUTCAR"
+            assert cell is not None, "Unexpected POSITION/TOTAL-FORCE block before direct lattice vectors in OUTCAR"
+            values = np.array(b" ".join(lines).split(), dtype=float).reshape(number_of_atoms, 6)
+            frame = {"number_of_atoms": [number_of_atoms], "positions": values[:, :3]*uc.length,
+                     "symbols": symbols, "forces": values[:, 3:]*uc.force, "charges": zeros,
+                     "atomic_energies": zeros, "atom_ids": atom_ids, "cells": cell.ravel()*uc.length,
+                     "total_charges": 0.0}
+        elif frame is not None:
+            if b"FREE ENERGIE OF THE ION-ELECTRON SYSTEM" in line:
+                free_energy = True
+            elif free_energy and b"TOTEN" in line:
+                frame["total_energies"] = float(line.split()[-2])*uc.energy
+                yield frame
+                frame, free_energy = None, False
+
+
+def iter_outcar_frames(filename, symbol_list=None, uc=UnitConversion(), start=0, stop=None, stride=1):
+    """This function iterates over ionic steps of an OUTCAR file and yields a dictionary of arrays
+    for each step (see parse_outcar_frames). Compressed files are read transparently (see open_file)."""
+    with open_file(filename, 'rb') as in_file:
+        for frame in parse_outcar_frames(in_file, symbol_list, uc, start, stop, stride):
+            yield frame
+
+
+def iter_outcar(filename, symbol_list=None, uc=UnitConversion(), start=0, stop=None, stride=1):
+    """This function iterates over the ionic steps of an OUTCAR file as samples without loading the whole file."""
+    for frame in iter_outcar_frames(filename, symbol_list, uc, start, stop, stride):
+        yield DataSet().extend_arrays(**frame).samples[0]
+
+
+def read_vasp_run(arguments):
+    """This function reads the ionic steps of a VASP run (path, symbol_list, uc, start, stop, stride) into
+    a data set, where path is a run directory or an OUTCAR file. Errors are returned instead of raised, so that
+    read_vasp_runs can skip unfinished or corrupt runs: the result is (path, data set, None) or
+    (path, None, error message)."""
+    path, symbol_list, uc, start, stop, stride = arguments
+    filename = path
+    if os.path.isdir(path):
+        # plain or compressed OUTCAR file (e.g. OUTCAR.gz)
+        candidates = [os.path.join(path, "OUTCAR" + suffix) for suffix in [""] + sorted(COMPRESSION_SUFFIXES)]
+        filename = next((candidate for candidate in candidates if os.path.isfile(candidate)), candidates[0])
+    try:
+        dataset = DataSet()
+        for frame in iter_outcar_frames(filename, symbol_list, uc, start, stop, stride):
+            dataset.extend_arrays(**frame)
+        if dataset.number_of_samples == 0:
+            return path, None, "No complete ionic step found"
+        return path, dataset.consolidate(), None
+    except Exception as error:
+        return path, None, "%s: %s" % (type(error).__name__, error)
 
 
 # ----------------------------------------------------------------------------
@@ -11,6 +120,7 @@ class RuNNerAdaptorForVASP(RunnerAdaptor):
 
     def __init__(self):
         RunnerAdaptor.__init__(self)
+        self.failed_runs = []  # list of (path, error message) of runs skipped by read_vasp_runs
 
     def write_poscar(self, symbol_list=None, filename='POSCAR', uc=UnitConversion(), scaling_factor=1.0):
         """This method writes data set into POSCAR file format (VASP package)."""
@@ -45,7 +155,7 @@ class RuNNerAdaptorForVASP(RunnerAdaptor):
         """This method reads POSCAR file format (VASP package)."""
         # create a instance of sample data
         sample = SampleData()
-        with open(str(filename), 'r') as in_file:
+        with open_file(filename, 'r') as in_file:
             # loop over lines in file
             for line in in_file:
                 # create a instance of sample data
@@ -96,7 +206,7 @@ class RuNNerAdaptorForVASP(RunnerAdaptor):
 
     def read_outcar(self, filename='OUTCAR', uc=UnitConversion()):
         """This method reads OUTCAT file (VASP package)."""
-        with open(filename, 'r') as in_file:
+        with open_file(filename, 'r') as in_file:
             # loop over lines in file
             for line in in_file:
                 # read the force section
@@ -115,6 +225,44 @@ class RuNNerAdaptorForVASP(RunnerAdaptor):
         # return object
         return self
 
+    def read_outcar_steps(self, filename='OUTCAR', symbol_list=None, uc=UnitConversion(), start=0, stop=None,
+                          stride=1):
+        """This method reads all (or every stride-th) ionic steps of an OUTCAR file (VASP package) as samples,
+        e.g. from AIMD or relaxation runs. No POSCAR file is required (see parse_outcar_frames)."""
+        for frame in iter_outcar_frames(filename, symbol_list, uc, start, stop, stride):
+            self.dataset.extend_arrays(**frame)
+        # return object
+        return self
+
+    def read_vasp_runs(self, pattern, symbol_list=None, uc=UnitConversion(), processes=None, start=0, stop=None,
+                       stride=1, verbose=False):
+        """This method reads many VASP runs given by a glob pattern of run directories (or OUTCAR files),
+        e.g. "calculations/*/run_*". The OUTCAR files are parsed in a pool of processes (None means all cores)
+        and merged in the sorted order of paths (see read_outcar_steps for the arguments).
+        Unfinished or corrupt runs are skipped and kept in failed_runs. With verbose a progress report
+        with the number of files per second is printed."""
+        paths = sorted(glob.glob(str(pattern), recursive=True))
+        processes = min(get_number_of_processes(processes), max(1, len(paths)))
+        arguments = [(path, symbol_list, uc, start, stop, stride) for path in paths]
+        chunksize = max(1, len(paths)//(16*processes))
+        self.failed_runs = []
+        start_time = time.time()
+        for n_run, (path, dataset, error) in enumerate(iter_parallel_map(read_vasp_run, arguments, processes,
+                                                                         chunksize), start=1):
+            if dataset is None:
+                self.failed_runs.append((path, error))
+            else:
+                self.dataset.extend(dataset)
+            if verbose and (n_run % max(1, len(paths)//20) == 0 or n_run == len(paths)):
+                elapsed = max(time.time() - start_time, 1e-9)
+                print("Read %d/%d runs (%d failed) in %.1f s, %.1f files/s"
+                      % (n_run, len(paths), len(self.failed_runs), elapsed, n_run/elapsed))
+        if verbose:
+            for path, error in self.failed_runs:
+                print("Skipped %s (%s)" % (path, error))
+        # return object
+        return self
+
     def read_vasp(self, symbol_list=None, uc=UnitConversion()):
         """This method read all required data from VASP including structure (POSCAR) and forces (OUTCAR)."""
         self.read_poscar(symbol_list=symbol_list, uc=uc)